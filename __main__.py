@@ -1,9 +1,16 @@
 import asyncio
 import contextlib
+import copy
 import functools
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import signal
+import subprocess
 import sys
+import threading
 import time
 import traceback
 import types
@@ -14,8 +21,6 @@ import click
 import uvloop
 from ruamel import yaml
 
-from bot import Bot
-
 
 asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
@@ -35,6 +40,80 @@ def get_config():
     return convert(config)
 
 
+class RateLimitFilter(logging.Filter):
+
+    # Repeats of the same warning are counted instead of each being written
+    def __init__(self, *, rate=5, per=60):
+        super().__init__()
+        self.rate = rate
+        self.per = per
+        self.windows = {}
+        # Filters run in whichever thread logs, executor threads included
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno != logging.WARNING:
+            return True
+        with self.lock:
+            return self._filter(record)
+
+    def _filter(self, record):
+        now = time.monotonic()
+        if len(self.windows) > 1000:
+            self.windows = {key: window
+                            for key, window in self.windows.items()
+                            if now - window[0] < self.per}
+        key = (record.name, record.getMessage())
+        window = self.windows.get(key)
+        if window is None or now - window[0] >= self.per:
+            suppressed = window[2] if window is not None else 0
+            self.windows[key] = [now, 1, 0]
+            if suppressed:
+                record.msg = (f'{record.getMessage()} (repeated '
+                              f'{suppressed} more times before)')
+                record.args = None
+            return True
+        elif window[1] < self.rate:
+            window[1] += 1
+            return True
+        else:
+            window[2] += 1
+            return False
+
+
+class JSONFormatter(logging.Formatter):
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record, self.datefmt),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data)
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+
+    # The stock prepare formats the record with the default formatter,
+    # which folds the traceback into the message on 3.8+ and drops it on
+    # 3.6, so only the text the file formatter needs is kept instead
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info)
+        # Tracebacks hold on to frames, so they aren't sent to the thread
+        record.exc_info = None
+        return record
+
+
 @contextlib.contextmanager
 def setup_logging():
     logger_discord = logging.getLogger('discord')
@@ -48,30 +127,83 @@ def setup_logging():
         'ignore', message='Not importing directory .*: missing __init__',
         category=ImportWarning, module='importlib')
 
-    handler = logging.FileHandler(filename='discord.log', encoding='utf-8')
-    formatter = logging.Formatter(
-        '[{asctime}] [{levelname}] {name}: {message}', style='{')
+    # Cluster workers each get their own log
+    shard_ids = click.get_current_context().params.get('shard_ids')
+    if shard_ids:
+        filename = f'discord.{shard_ids[0]}-{shard_ids[-1]}.log'
+    else:
+        filename = 'discord.log'
+
+    config = getattr(get_config(), 'logging', None)
+    file_handler = logging.handlers.RotatingFileHandler(
+        filename=filename, encoding='utf-8',
+        maxBytes=getattr(config, 'max_bytes', 32 * 1024 * 1024),
+        backupCount=getattr(config, 'backups', 5))
+    if getattr(config, 'json', False):
+        formatter = JSONFormatter()
+    else:
+        formatter = logging.Formatter(
+            '[{asctime}] [{levelname}] {name}: {message}', style='{')
     formatter.datefmt = '%Y-%m-%d %H:%M:%S'
     formatter.converter = time.gmtime
-    handler.setFormatter(formatter)
+    file_handler.setFormatter(formatter)
+
+    # Records are only queued on the loop, the file is written from a thread
+    log_queue = queue.Queue()
+    handler = QueueHandler(log_queue)
+    handler.addFilter(RateLimitFilter(rate=getattr(config, 'rate', 5),
+                                      per=getattr(config, 'per', 60)))
+    listener = logging.handlers.QueueListener(log_queue, file_handler)
+    listener.start()
 
     logger_discord.addHandler(handler)
     logger_warnings.addHandler(handler)
 
-    yield
+    logger_extensions = logging.getLogger('extensions')
+    logger_extensions.setLevel(logging.INFO)
+    logger_extensions.addHandler(handler)
+
+    logger_utils = logging.getLogger('utils')
+    logger_utils.setLevel(logging.INFO)
+    logger_utils.addHandler(handler)
 
-    logging.shutdown()
+    try:
+        yield
+    finally:
+        listener.stop()
+        logging.shutdown()
+
+
+def parse_shard_ids(ctx, param, value):
+    if value is None:
+        return None
+
+    shard_ids = []
+    try:
+        for part in value.split(','):
+            start, _, end = part.partition('-')
+            shard_ids.extend(range(int(start), int(end or start) + 1))
+    except ValueError:
+        raise click.BadParameter("Expected ranges like 0-3,8")
+    return shard_ids
 
 
 @click.group(invoke_without_command=True)
+@click.option('--shard-ids', callback=parse_shard_ids)
+@click.option('--shard-count', type=int)
 @click.pass_context
 @setup_logging()
-def main(ctx):
+def main(ctx, shard_ids, shard_count):
     if ctx.invoked_subcommand is not None:
         return
+    if shard_ids is not None and shard_count is None:
+        raise click.UsageError("--shard-ids requires --shard-count")
+
+    # Only needed to run the bot, not for the cluster and db commands
+    from bot import Bot
 
     config = get_config()
-    bot = Bot(config=config)
+    bot = Bot(config=config, shard_ids=shard_ids, shard_count=shard_count)
 
     for extension in config.extensions:
         try:
@@ -95,6 +227,74 @@ def main(ctx):
     bot.run(config.settings.token)
 
 
+@main.command()
+@click.option('--workers', type=int)
+@click.option('--shards', type=int)
+def cluster(workers, shards):
+    config = get_config()
+    cluster_config = getattr(config, 'cluster', None)
+    if workers is None:
+        workers = getattr(cluster_config, 'workers', 1)
+    if shards is None:
+        shards = getattr(cluster_config, 'shards', workers)
+    if workers > shards:
+        raise click.BadParameter("Can't have more workers than shards")
+
+    # Contiguous shard ranges, spreading the remainder over the first ones
+    size, extra = divmod(shards, workers)
+    ranges = []
+    for i in range(workers):
+        start = i * size + min(i, extra)
+        ranges.append(range(start, start + size + (i < extra)))
+
+    def start_worker(i):
+        shard_ids = f'{ranges[i][0]}-{ranges[i][-1]}'
+        click.echo(f"Starting worker {i} with shards {shard_ids}", err=True)
+        args = [sys.executable, os.path.abspath(__file__),
+                '--shard-ids', shard_ids, '--shard-count', str(shards)]
+        return subprocess.Popen(args)
+
+    # Make sure the workers get stopped on termination as well
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit())
+
+    processes = {i: start_worker(i) for i in range(workers)}
+    start_times = dict.fromkeys(processes, time.monotonic())
+    delays = dict.fromkeys(processes, 1)
+    restarts = {}
+    try:
+        while processes or restarts:
+            time.sleep(1)
+            now = time.monotonic()
+            for i, process in list(processes.items()):
+                code = process.poll()
+                if code is None:
+                    continue
+                del processes[i]
+                if code == 0:
+                    click.echo(f"Worker {i} exited", err=True)
+                    continue
+
+                # Back off from workers that crash right after starting
+                if now - start_times[i] < 60:
+                    delays[i] = min(delays[i] * 2, 300)
+                else:
+                    delays[i] = 1
+                click.echo(f"Worker {i} exited with code {code}, restarting "
+                           f"in {delays[i]}s", err=True)
+                restarts[i] = now + delays[i]
+
+            for i, restart_time in list(restarts.items()):
+                if restart_time <= now:
+                    del restarts[i]
+                    processes[i] = start_worker(i)
+                    start_times[i] = now
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.wait()
+
+
 @main.group()
 @click.pass_context
 def db(ctx):
@@ -142,16 +342,42 @@ def drop(obj, *args, **kwargs):
         *args, **kwargs, file='drop.sql', connection=obj.connection))
 
 
+async def execute_migrations(paths, *, connection):
+    async with connection.transaction():
+        for path in paths:
+            await execute_file(path, connection=connection)
+
+
 @db.command()
 @click.argument('extension')
+@click.argument('names', nargs=-1)
 @click.pass_obj
-def migrate(obj, extension):
+def migrate(obj, extension, names):
+    # Migrations are picked by name or number, the newest by default
     path = os.path.join('extensions', extension, 'sql', 'migrations')
-    migrations = os.listdir(path)
-    migration = sorted(migrations, reverse=True)[0]
-    click.confirm(f"Is {migration} the right migration?", abort=True, err=True)
-    obj.loop.run_until_complete(execute_file(
-        migration, connection=obj.connection))
+    migrations = sorted(os.listdir(path))
+    if names:
+        selected = []
+        for name in names:
+            matches = [migration for migration in migrations
+                       if migration == name or
+                       migration.split('_', 1)[0] == name or
+                       os.path.splitext(migration)[0] == name]
+            if not matches:
+                raise click.BadParameter(f"No migration named {name}",
+                                         param_hint='names')
+            selected.extend(matches)
+        # Applied in order whatever order they were given in
+        selected = sorted(set(selected))
+    else:
+        selected = migrations[-1:]
+        click.confirm(f"Is {selected[0]} the right migration?", abort=True,
+                      err=True)
+    for migration in selected:
+        click.echo(f"Running {migration}", err=True)
+    obj.loop.run_until_complete(execute_migrations(
+        [os.path.join(path, migration) for migration in selected],
+        connection=obj.connection))
 
 
 if __name__ == '__main__':
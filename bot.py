@@ -1,32 +1,51 @@
 import asyncio
 import contextlib
 import sys
-import time
 
 import aiohttp
 import asyncpg
 import discord
 from discord.ext import commands
 
-from utils import Context, Emoji, cache
+from utils import (Context, CooldownDisplay, Emoji, LoopMonitor,
+                   TraceBuffer, WaiterRegistry, cache, get_prefix, queries)
 
 
 @cache(maxsize=None, ignore=['bot'], on={'message': '.guild'})
 async def command_prefix(bot, message):
     if message.guild is not None:
-        prefix = await bot.pool.fetchval("""
-            SELECT prefix FROM meta.guilds WHERE id = $1;
-        """, message.guild.id)
+        prefix = await get_prefix.fetchval(bot.pool, message.guild.id)
     else:
         prefix = None
 
+    guild_id = message.guild.id if message.guild is not None else None
+    bot.prefixes[guild_id] = compile_prefixes(prefix, bot.user.id)
+
     if prefix is not None:
         return commands.when_mentioned_or(prefix)(bot, message)
     else:
         return commands.when_mentioned(bot, message)
 
 
-class Bot(commands.Bot):
+def compile_prefixes(prefix, user_id):
+    # Same forms as when_mentioned_or, as a tuple for str.startswith
+    mentions = (f'<@{user_id}> ', f'<@!{user_id}> ')
+    if prefix is not None:
+        return (prefix, *mentions)
+    else:
+        return mentions
+
+
+# Background has room for a bulk edit's workers alongside the rest, and
+# statistics writes from every command get their own pool
+POOL_DEFAULTS = {
+    'interactive': {},
+    'background': {'min_size': 2, 'max_size': 8},
+    'statistics': {'min_size': 1, 'max_size': 3},
+}
+
+
+class Bot(commands.AutoShardedBot):
 
     def __init__(self, *, config, **kwargs):
         super().__init__(command_prefix=command_prefix,
@@ -34,13 +53,35 @@ class Bot(commands.Bot):
         self.connect_event = asyncio.Event()
         self.ready_event = asyncio.Event()
         self.config = config
-        self.pool = self.loop.run_until_complete(
-            asyncpg.create_pool(config.settings.dsn, init=self.init_connection,
-                                setup=self.setup_connection))
+        # Background work gets its own pool so it can't hold up commands
+        self.pools = {
+            role: self.loop.run_until_complete(self._create_pool(role))
+            for role in POOL_DEFAULTS
+        }
+        self.pool = self.pools['interactive']
         self.session = aiohttp.ClientSession(loop=self.loop)
-        self.cooldowns = []
+        self.cooldowns = CooldownDisplay(loop=self.loop)
+        self.prefixes = {}
+        self.waiters = WaiterRegistry(loop=self.loop)
+        self.traces = TraceBuffer()
+        monitor_config = getattr(config, 'monitor', None)
+        self.monitor = LoopMonitor(
+            loop=self.loop,
+            threshold=getattr(monitor_config, 'threshold', 0.5))
+        self.monitor.start()
         self.loop.create_task(self.display())
 
+    def _create_pool(self, role):
+        # Sized per process as a cluster runs its pools for each worker
+        pools_config = getattr(self.config, 'pools', None)
+        pool_config = getattr(pools_config, role, None)
+        pool_kwargs = dict(POOL_DEFAULTS[role])
+        if pool_config is not None:
+            pool_kwargs.update(vars(pool_config))
+        return asyncpg.create_pool(
+            self.config.settings.dsn, init=self.init_connection,
+            setup=self.setup_connection, **pool_kwargs)
+
     async def display(self):
         await self.wait_until_ready()
         with contextlib.redirect_stdout(sys.stderr):
@@ -58,6 +99,8 @@ class Bot(commands.Bot):
                  for extension in self.extensions.values()
                  if hasattr(extension, 'init_connection')]
         await asyncio.gather(*inits)
+        # After the extensions, as statements can depend on their codecs
+        await queries.prepare(connection)
 
     async def setup_connection(self, connection):
         setups = [extension.setup_connection(self, connection)
@@ -69,7 +112,20 @@ class Bot(commands.Bot):
         super().load_extension(name)
         extension = self.extensions[name]
         if hasattr(extension, 'init_connection'):
-            self.loop.create_task(self.pool.expire_connections())
+            for pool in self.pools.values():
+                self.loop.create_task(pool.expire_connections())
+
+    def invalidate_prefix(self, guild):
+        self.command_prefix.invalidate(guild)
+        self.prefixes.pop(guild.id, None)
+
+    def dispatch(self, event, *args, **kwargs):
+        super().dispatch(event, *args, **kwargs)
+        # Only wake the waiters of the message the event is about
+        if event in ('reaction_add', 'reaction_remove'):
+            self.waiters.dispatch(event, args[0].message.id, *args)
+        elif event == 'message_edit':
+            self.waiters.dispatch(event, args[1].id, *args)
 
     def is_connected(self):
         return self.connect_event.is_set()
@@ -83,6 +139,13 @@ class Bot(commands.Bot):
 
         self.connect_event.clear()
         self.ready_event.clear()
+        self.cooldowns.close()
+        self.monitor.stop()
+        # Let extensions flush anything buffered while the pool is usable
+        closes = [extension.close(self)
+                  for extension in self.extensions.values()
+                  if hasattr(extension, 'close')]
+        await asyncio.gather(*closes)
         await self.session.close()
         await super().close()
 
@@ -100,7 +163,13 @@ class Bot(commands.Bot):
         if not isinstance(error, discord.Forbidden):
             await super().on_error(*args, **kwargs)
 
+    def _record_trace(self, ctx):
+        trace = ctx.trace.finish(ctx.command.qualified_name)
+        if trace.spans:
+            self.traces.add(trace)
+
     async def on_command_completion(self, ctx):
+        self._record_trace(ctx)
         if not getattr(ctx, 'ignore', False):
             await ctx.message.add_reaction(str(Emoji.white_check_mark))
 
@@ -109,29 +178,14 @@ class Bot(commands.Bot):
         if getattr(error, 'ignore', False) or isinstance(error, ignored):
             return
 
+        self._record_trace(ctx)
+
         if isinstance(error, commands.UserInputError):
             await ctx.message.add_reaction(str(Emoji.question))
         elif isinstance(error, commands.CommandOnCooldown):
             if ctx.command in self.cooldowns:
                 return
-            self.cooldowns.append(ctx.command)
-
-            await ctx.message.add_reaction(str(Emoji.no_entry))
-            remaining = error.retry_after
-            interval = remaining / 12
-            start_time = time.time()
-            while remaining > 0:
-                # Start at 12 instead of 1
-                number = 12 - int(remaining / interval) or 12
-                clock = Emoji['clock' + str(number)]
-                await ctx.message.add_reaction(str(clock))
-                delay = min(max(interval, 2), remaining)
-                await asyncio.sleep(delay)
-                await ctx.message.remove_reaction(str(clock), ctx.me)
-                remaining = error.retry_after - (time.time() - start_time)
-            await ctx.message.add_reaction(str(Emoji.repeat))
-            await ctx.message.remove_reaction(str(Emoji.no_entry), ctx.me)
-            self.cooldowns.remove(ctx.command)
+            await self.cooldowns.start(ctx, error.retry_after)
         elif (isinstance(error, commands.CheckFailure) or (
               isinstance(error, commands.CommandInvokeError) and
               isinstance(error.original, discord.Forbidden))):
@@ -147,4 +201,10 @@ class Bot(commands.Bot):
         if message.author.bot or not self.ready_event.is_set():
             return
 
+        # Skip building a context for messages that can't be commands
+        guild_id = message.guild.id if message.guild is not None else None
+        prefixes = self.prefixes.get(guild_id)
+        if prefixes is not None and not message.content.startswith(prefixes):
+            return
+
         await self.process_commands(message)
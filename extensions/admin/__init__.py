@@ -1,6 +1,13 @@
+import asyncio
+import io
+import time
+
+import discord
 from discord.ext import commands
 
 from .converters import Command
+from .memory import MemorySession
+from .profiler import SamplingProfiler
 
 
 class Admin:
@@ -8,6 +15,11 @@ class Admin:
     def __init__(self, bot):
         self.bot = bot
         self.hidden = True
+        self.memory_session = None
+
+    def __unload(self):
+        if self.memory_session is not None:
+            self.memory_session.stop()
 
     async def __local_check(self, ctx):
         return (await self.bot.is_owner(ctx.author) or
@@ -46,6 +58,67 @@ class Admin:
         for command in group.walk_commands():
             command.enabled = True
 
+    @commands.command()
+    async def traces(self, ctx, count: int = 5):
+        pages = []
+        for trace in self.bot.traces.slowest(count):
+            ago = int(time.time() - trace.created_at)
+            lines = [f'{trace.name}: {trace.duration * 1000:.0f}ms '
+                     f'({ago}s ago)']
+            for span in sorted(trace.spans, key=lambda span: span.start):
+                tags = ' '.join(f'{name}={value}'
+                                for name, value in span.tags.items())
+                lines.append(f'  {span.start * 1000:>7.0f}ms '
+                             f'{span.name:<10} {span.duration * 1000:.0f}ms '
+                             f'{tags}'.rstrip())
+            pages.append('```' + '\n'.join(lines)[:2000 - 6] + '```')
+        if not pages:
+            raise commands.BadArgument
+        await ctx.paginate(pages)
+
+    @commands.command()
+    async def profile(self, ctx, seconds: float = 10):
+        if not 0 < seconds <= 120:
+            raise commands.BadArgument
+
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.stop()
+
+        data = profiler.collapsed().encode()
+        file = discord.File(io.BytesIO(data), 'profile.collapsed')
+        await ctx.send(f'{profiler.samples} samples over {seconds}s',
+                       file=file)
+
+    @commands.group(invoke_without_command=True)
+    async def memory(self, ctx):
+        if self.memory_session is None:
+            raise commands.BadArgument
+
+        # Snapshots walk every traced block, so keep it off the loop
+        report = await self.bot.loop.run_in_executor(
+            None, self.memory_session.diff)
+        await ctx.send(f'```{report[:2000 - 6]}```')
+
+    @memory.command(name='start')
+    async def memory_start(self, ctx, frames: int = 1):
+        if self.memory_session is not None:
+            raise commands.BadArgument
+
+        self.memory_session = MemorySession(frames=frames)
+        await self.bot.loop.run_in_executor(None, self.memory_session.start)
+
+    @memory.command(name='stop')
+    async def memory_stop(self, ctx):
+        if self.memory_session is None:
+            raise commands.BadArgument
+
+        self.memory_session.stop()
+        self.memory_session = None
+
 
 def setup(bot):
     bot.add_cog(Admin(bot))
@@ -0,0 +1,53 @@
+import collections
+import gc
+import tracemalloc
+
+
+def _count_types():
+    return collections.Counter(type(obj).__qualname__
+                               for obj in gc.get_objects())
+
+
+class MemorySession:
+
+    # Tracing slows down every allocation, so it's only on during a session
+    def __init__(self, *, frames=1):
+        self.frames = frames
+        self.snapshot = None
+        self.types = None
+
+    def start(self):
+        tracemalloc.start(self.frames)
+        self.snapshot = self._take_snapshot()
+        self.types = _count_types()
+
+    def stop(self):
+        tracemalloc.stop()
+        self.snapshot = None
+        self.types = None
+
+    def _take_snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ])
+
+    def diff(self, *, limit=10):
+        snapshot = self._take_snapshot()
+        types = _count_types()
+        stats = snapshot.compare_to(self.snapshot, 'lineno')
+        type_diffs = collections.Counter(types)
+        type_diffs.subtract(self.types)
+        # Later diffs are against this one
+        self.snapshot, self.types = snapshot, types
+
+        lines = ["Top growth by line:"]
+        for stat in stats[:limit]:
+            frame = stat.traceback[0]
+            lines.append(f'{stat.size_diff / 1024:+10.1f} KiB '
+                         f'{stat.count_diff:+8} {frame.filename}:'
+                         f'{frame.lineno}')
+        lines.append("Top growth by type:")
+        for name, count in type_diffs.most_common(limit):
+            lines.append(f'{count:+8} {name} ({types[name]} total)')
+        return '\n'.join(lines)
@@ -0,0 +1,52 @@
+import collections
+import sys
+import threading
+import time
+
+
+class SamplingProfiler:
+
+    # Nothing is hooked into the interpreter, the stacks of every thread are
+    # only read from a separate thread for as long as it runs
+    def __init__(self, *, interval=0.005):
+        self.interval = interval
+        self.samples = 0
+        self.stacks = collections.Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='sampling-profiler')
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stopped.is_set():
+            start_time = time.perf_counter()
+            names = {thread.ident: thread.name
+                     for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} '
+                                 f'({code.co_filename}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+            elapsed = time.perf_counter() - start_time
+            self._stopped.wait(max(self.interval - elapsed, 0))
+
+    def collapsed(self):
+        # The format taken by flamegraph.pl and speedscope
+        lines = (f'{stack} {count}'
+                 for stack, count in self.stacks.most_common())
+        return '\n'.join(lines) + '\n'
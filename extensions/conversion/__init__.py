@@ -1,6 +1,7 @@
 import io
 import json
 import os
+import time
 import types
 
 import discord
@@ -8,11 +9,33 @@ import pyfiglet
 from discord.ext import commands
 from PIL import Image
 
-from utils import Emoji, acquire, cache, ignore, invoke
+from utils import Emoji, acquire, cache, ignore, invoke, queries
+from utils.metrics import registry
 
 from .converters import ImageURL
 from .utils import url_regex
 
+select_config = queries.add('conversion.get_config', """
+    SELECT * FROM conversion.guilds WHERE id = $1;
+""")
+insert_guilds = queries.add('conversion.insert_guilds', """
+    INSERT INTO conversion.guilds (id)
+    SELECT unnest($1::bigint[])
+    ON CONFLICT DO NOTHING;
+""")
+update_pm = queries.add('conversion.update_pm', """
+    UPDATE conversion.guilds
+    SET pm = $1
+    WHERE id = $2;
+""")
+
+art_jobs = registry.gauge('conversion_art_jobs',
+                          "Art conversions queued or running in the executor")
+art_wait = registry.histogram('conversion_art_wait_seconds',
+                              "Time art conversions spent queued")
+art_duration = registry.histogram('conversion_art_duration_seconds',
+                                  "Time art conversions spent running")
+
 
 class Conversion:
 
@@ -26,9 +49,7 @@ class Conversion:
 
     @cache(maxsize=None, ignore=['connection'])
     async def get_config(self, guild, *, connection):
-        record = await connection.fetchrow("""
-            SELECT * FROM conversion.guilds WHERE id = $1;
-        """, guild.id)
+        record = await select_config.fetchrow(connection, guild.id)
         return types.SimpleNamespace(**record)
 
     async def send(self, ctx, *args, **kwargs):
@@ -40,30 +61,29 @@ class Conversion:
         else:
             pm = False
 
-        if pm:
-            await ctx.author.send(*args, **kwargs)
-            try:
-                await ctx.message.add_reaction(str(Emoji.white_check_mark))
-            except discord.Forbidden:
-                pass
-        else:
-            await ctx.send(*args, **kwargs)
-
-    async def _add_guild(self, guild, *, connection):
-        await connection.execute("""
-            INSERT INTO conversion.guilds (id)
-            VALUES ($1)
-            ON CONFLICT DO NOTHING;
-        """, guild.id)
-
-    @acquire()
+        size = len(args[0]) if args else 0
+        with ctx.trace.span('send', size=size, pm=pm):
+            if pm:
+                await ctx.author.send(*args, **kwargs)
+                try:
+                    await ctx.message.add_reaction(
+                        str(Emoji.white_check_mark))
+                except discord.Forbidden:
+                    pass
+            else:
+                await ctx.send(*args, **kwargs)
+
+    async def _add_guilds(self, guilds, *, connection):
+        await insert_guilds.execute(
+            connection, [guild.id for guild in guilds])
+
+    @acquire(pool='background')
     async def on_ready(self, connection):
-        for guild in self.bot.guilds:
-            await self._add_guild(guild, connection=connection)
+        await self._add_guilds(self.bot.guilds, connection=connection)
 
-    @acquire()
+    @acquire(pool='background')
     async def on_guild_join(self, guild, connection):
-        await self._add_guild(guild, connection=connection)
+        await self._add_guilds([guild], connection=connection)
 
     @commands.group(invoke_without_command=True)
     @ignore
@@ -111,16 +131,24 @@ class Conversion:
         elif attachments:
             raise commands.TooManyArguments
 
-        async with self.bot.session.head(url) as response:
-            allowed_types = ['image/png', 'image/jpeg', 'image/webp']
-            if response.headers['content-type'] not in allowed_types:
-                raise commands.BadArgument
+        with ctx.trace.span('head'):
+            async with self.bot.session.head(url) as response:
+                allowed_types = ['image/png', 'image/jpeg', 'image/webp']
+                if response.headers['content-type'] not in allowed_types:
+                    raise commands.BadArgument
 
-        async with self.bot.session.get(url) as response:
-            data = await response.read()
+        with ctx.trace.span('download') as span:
+            async with self.bot.session.get(url) as response:
+                data = await response.read()
+            span.tags['size'] = len(data)
 
         def convert():
-            image = Image.open(io.BytesIO(data)).convert('L')
+            nonlocal started_at
+            started_at = time.perf_counter()
+            with ctx.trace.span('decode') as span:
+                image = Image.open(io.BytesIO(data))
+                span.tags['size'] = image.size
+                image = image.convert('L')
 
             max_length = 2000 - 6  # Offset backticks
             aspect = image.width / (image.height / 2)  # Negate stretching
@@ -130,20 +158,34 @@ class Conversion:
             while x * y + y - 1 > max_length:
                 y -= 1
                 x = y * aspect
-            image = image.resize(map(int, [x, y]), Image.BILINEAR)
-
-            output = []
-            pixels = image.load()
-            for y in range(image.height):
-                row = []
-                for x in range(image.width):
-                    key = lambda char: abs(pixels[x, y] - self.chars[char])
-                    char = sorted(self.chars, key=key)[0]
-                    row.append(char)
-                output.append(''.join(row))
-            return '\n'.join(output)
-
-        art = await self.bot.loop.run_in_executor(None, convert)
+            with ctx.trace.span('resize') as span:
+                image = image.resize(map(int, [x, y]), Image.BILINEAR)
+                span.tags['size'] = image.size
+
+            with ctx.trace.span('map'):
+                output = []
+                pixels = image.load()
+                for y in range(image.height):
+                    row = []
+                    for x in range(image.width):
+                        key = lambda char: abs(pixels[x, y] -
+                                               self.chars[char])
+                        char = sorted(self.chars, key=key)[0]
+                        row.append(char)
+                    output.append(''.join(row))
+                return '\n'.join(output)
+
+        # Timings are only recorded back on the loop thread
+        started_at = None
+        queued_at = time.perf_counter()
+        art_jobs.inc()
+        try:
+            art = await self.bot.loop.run_in_executor(None, convert)
+        finally:
+            art_jobs.dec()
+            if started_at is not None:
+                art_wait.observe(started_at - queued_at)
+                art_duration.observe(time.perf_counter() - started_at)
         await self.send(ctx, f'```{art}```')
 
     @art.command(name='last')
@@ -170,12 +212,14 @@ class Conversion:
     @ignore
     async def text(self, ctx, *, text):
         """Convert text into ASCII text."""
-        for font in ('big', 'standard', 'small'):
-            render = pyfiglet.figlet_format(text, font=font)
-            if len(render) <= 2000 - 6:
-                break
-        else:
-            raise commands.CheckFailure
+        with ctx.trace.span('render', length=len(text)) as span:
+            for font in ('big', 'standard', 'small'):
+                render = pyfiglet.figlet_format(text, font=font)
+                if len(render) <= 2000 - 6:
+                    break
+            else:
+                raise commands.CheckFailure
+            span.tags.update(font=font, size=len(render))
         if not render:
             raise commands.BadArgument
         await self.send(ctx, f'```{render}```')
@@ -197,11 +241,7 @@ class Conversion:
     @commands.guild_only()
     async def pm(self, ctx, toggle: bool):
         """Configure conversions to be sent via private message."""
-        await self.bot.pool.execute("""
-            UPDATE conversion.guilds
-            SET pm = $1
-            WHERE id = $2;
-        """, toggle, ctx.guild.id)
+        await update_pm.execute(self.bot.pool, toggle, ctx.guild.id)
         self.get_config.invalidate(ctx.guild)
 
 
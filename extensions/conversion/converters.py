@@ -16,15 +16,22 @@ class ImageURL(commands.Converter):
         self.check_emoji = emoji
 
     async def convert(self, ctx, argument):
+        with ctx.trace.span('image_url') as span:
+            url, span.tags['source'] = await self._convert(ctx, argument)
+        return url
+
+    async def _convert(self, ctx, argument):
         if self.check_embed and url_regex.fullmatch(argument) is not None:
             if ctx.message.embeds:
                 embed = ctx.message.embeds[0]
             else:
                 def check(_, message):
-                    return message.id == ctx.message.id and message.embeds
+                    return message.embeds
                 try:
-                    _, message = await ctx.bot.wait_for(
-                        'message_edit', timeout=2, check=check)
+                    with ctx.trace.span('embed_wait'):
+                        _, message = await ctx.bot.waiters.wait_for(
+                            'message_edit', ctx.message, timeout=2,
+                            check=check)
                 except asyncio.TimeoutError:
                     raise commands.BadArgument
 
@@ -32,7 +39,7 @@ class ImageURL(commands.Converter):
             if embed.type != 'image':
                 raise commands.CheckFailure
 
-            return embed.thumbnail.proxy_url
+            return embed.thumbnail.proxy_url, 'embed'
 
         if self.check_member:
             converter = commands.MemberConverter()
@@ -41,7 +48,7 @@ class ImageURL(commands.Converter):
             except commands.BadArgument:
                 pass
             else:
-                return member.avatar_url
+                return member.avatar_url, 'member'
 
         if self.check_emoji:
             converter = commands.PartialEmojiConverter()
@@ -50,6 +57,6 @@ class ImageURL(commands.Converter):
             except commands.BadArgument:
                 pass
             else:
-                return emoji.url
+                return emoji.url, 'emoji'
 
         raise commands.BadArgument
@@ -4,10 +4,20 @@ import operator
 import discord
 from discord.ext import commands
 
-from utils import Action, Emoji, acquire, get_color, ignore
+from utils import (Action, Emoji, acquire, get_color, get_prefix, ignore,
+                   queries)
 
 from .converters import Prefix
 
+insert_guilds = queries.add('meta.insert_guilds', """
+    INSERT INTO meta.guilds (id)
+    SELECT unnest($1::bigint[])
+    ON CONFLICT DO NOTHING;
+""")
+update_prefix = queries.add('meta.update_prefix', """
+    UPDATE meta.guilds SET prefix = $1 WHERE id = $2;
+""")
+
 
 class Meta:
 
@@ -23,20 +33,17 @@ class Meta:
         self.bot.remove_command('help')
         self.bot.add_command(self._old_help)
 
-    async def _add_guild(self, guild, *, connection):
-        await connection.execute("""
-            INSERT INTO meta.guilds (id) VALUES ($1)
-            ON CONFLICT DO NOTHING;
-        """, guild.id)
+    async def _add_guilds(self, guilds, *, connection):
+        await insert_guilds.execute(
+            connection, [guild.id for guild in guilds])
 
-    @acquire()
+    @acquire(pool='background')
     async def on_ready(self, connection):
-        for guild in self.bot.guilds:
-            await self._add_guild(guild, connection=connection)
+        await self._add_guilds(self.bot.guilds, connection=connection)
 
-    @acquire()
+    @acquire(pool='background')
     async def on_guild_join(self, guild, connection):
-        await self._add_guild(guild, connection=connection)
+        await self._add_guilds([guild], connection=connection)
 
     @commands.command()
     @ignore
@@ -116,9 +123,7 @@ class Meta:
     async def prefix(self, ctx):
         """Show the current prefix."""
         if ctx.guild is not None:
-            prefix = await ctx.pool.fetchval("""
-                SELECT prefix FROM meta.guilds WHERE id = $1;
-            """, ctx.guild.id)
+            prefix = await get_prefix.fetchval(ctx.pool, ctx.guild.id)
         else:
             prefix = None
 
@@ -135,20 +140,16 @@ class Meta:
     @commands.guild_only()
     async def prefix_set(self, ctx, prefix: Prefix):
         """Set a custom prefix."""
-        await ctx.pool.execute("""
-            UPDATE meta.guilds SET prefix = $1 WHERE id = $2;
-        """, prefix, ctx.guild.id)
-        self.bot.command_prefix.invalidate(ctx.guild)
+        await update_prefix.execute(ctx.pool, prefix, ctx.guild.id)
+        self.bot.invalidate_prefix(ctx.guild)
 
     @prefix.command(name='delete')
     @commands.has_permissions(manage_guild=True)
     @commands.guild_only()
     async def prefix_delete(self, ctx):
         """Delete the custom prefix."""
-        await ctx.pool.execute("""
-            UPDATE meta.guilds SET prefix = NULL WHERE id = $1;
-        """, ctx.guild.id)
-        self.bot.command_prefix.invalidate(ctx.guild)
+        await update_prefix.execute(ctx.pool, None, ctx.guild.id)
+        self.bot.invalidate_prefix(ctx.guild)
 
 
 def setup(bot):
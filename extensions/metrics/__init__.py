@@ -0,0 +1,113 @@
+import logging
+import math
+import time
+
+from aiohttp import web
+
+from utils.metrics import registry
+
+log = logging.getLogger(__name__)
+
+command_latency = registry.histogram(
+    'command_duration_seconds', "Time taken by commands",
+    ['command', 'status'])
+gateway_events = registry.counter(
+    'gateway_events_total', "Gateway events received", ['event'])
+gateway_latency = registry.gauge(
+    'gateway_latency_seconds', "Heartbeat latency per shard", ['shard'])
+pool_wait = registry.histogram(
+    'pool_acquire_seconds', "Time spent waiting for a pool connection",
+    ['pool'], buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25,
+                       .5, 1))
+pool_size = registry.gauge('pool_size', "Open pool connections", ['pool'])
+pool_idle = registry.gauge('pool_idle', "Idle pool connections", ['pool'])
+executor_queue = registry.gauge(
+    'executor_queue_size', "Jobs waiting for the default executor")
+
+
+class Metrics:
+
+    def __init__(self, bot):
+        self.bot = bot
+        config = getattr(bot.config, 'metrics', None)
+        self.host = getattr(config, 'host', '127.0.0.1')
+        # Cluster workers listen on consecutive ports by first shard
+        shard_ids = bot.shard_ids or [0]
+        self.port = getattr(config, 'port', 9100) + shard_ids[0]
+        self.runner = None
+        self.server_task = bot.loop.create_task(self.start_server())
+
+        for role, pool in bot.pools.items():
+            self._wrap_pool(role, pool)
+        registry.add_collector('bot', self.collect)
+
+    def __unload(self):
+        registry.remove_collector('bot')
+        for pool in self.bot.pools.values():
+            del pool._acquire
+        self.server_task.cancel()
+        if self.runner is not None:
+            self.bot.loop.create_task(self.runner.cleanup())
+
+    def _wrap_pool(self, role, pool):
+        # Every pool method goes through _acquire, not just pool.acquire
+        acquire = pool._acquire
+
+        async def _acquire(timeout):
+            start_time = time.perf_counter()
+            try:
+                return await acquire(timeout)
+            finally:
+                pool_wait.observe(time.perf_counter() - start_time, role)
+
+        pool._acquire = _acquire
+
+    def collect(self):
+        for role, pool in self.bot.pools.items():
+            # Not available publicly in asyncpg
+            pool_size.set(sum(holder._con is not None
+                              for holder in pool._holders), role)
+            pool_idle.set(sum(holder._con is not None and not holder._in_use
+                              for holder in pool._holders), role)
+
+        executor = getattr(self.bot.loop, '_default_executor', None)
+        if executor is not None:
+            executor_queue.set(executor._work_queue.qsize())
+
+        for shard_id, latency in self.bot.latencies:
+            if math.isfinite(latency):
+                gateway_latency.set(latency, shard_id)
+
+    async def start_server(self):
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle_metrics)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        log.info("Serving metrics on %s:%d", self.host, self.port)
+
+    async def handle_metrics(self, request):
+        return web.Response(text=registry.render(),
+                            content_type='text/plain', charset='utf-8')
+
+    async def on_socket_response(self, message):
+        if message['op'] == 0:
+            gateway_events.inc(message['t'])
+
+    async def on_command(self, ctx):
+        ctx.started_at = time.perf_counter()
+
+    async def on_command_completion(self, ctx):
+        command_latency.observe(time.perf_counter() - ctx.started_at,
+                                ctx.command.qualified_name, 'completed')
+
+    async def on_command_error(self, ctx, error):
+        if ctx.command is None or not hasattr(ctx, 'started_at'):
+            return
+        command_latency.observe(time.perf_counter() - ctx.started_at,
+                                ctx.command.qualified_name, 'failed')
+
+
+def setup(bot):
+    bot.add_cog(Metrics(bot))
@@ -1,30 +1,166 @@
 import asyncio
+import collections
+import json
+import logging
+import math
+import resource
+import sys
 import time
 
 import discord
 from discord.ext import commands
 
-from utils import get_color, ignore
+from utils import get_color, ignore, queries
+
+log = logging.getLogger(__name__)
+
+# Keep the rollups in step with the history in the same statement
+insert_command = queries.add('statistics.insert_command', """
+    WITH inserted AS (
+        INSERT INTO statistics.commands (
+            user_id, channel_id, guild_id, shard_id, command, cog
+        )
+        VALUES ($1, $2, $3, $4, $5, $6)
+        RETURNING id, command, used_at
+    ), total AS (
+        INSERT INTO statistics.command_uses (command, uses)
+        SELECT command, 1 FROM inserted
+        ON CONFLICT (command) DO UPDATE
+        SET uses = command_uses.uses + 1
+    ), daily AS (
+        INSERT INTO statistics.daily_command_uses (day, command, uses)
+        SELECT (used_at AT TIME ZONE 'UTC')::date, command, 1
+        FROM inserted
+        ON CONFLICT (day, command) DO UPDATE
+        SET uses = daily_command_uses.uses + 1
+    )
+    SELECT id, used_at FROM inserted;
+""")
+complete_command = queries.add('statistics.complete_command', """
+    UPDATE statistics.commands
+    SET completed = TRUE, trace = $3
+    WHERE id = $1 AND used_at = $2;
+""")
+insert_error = queries.add('statistics.insert_error', """
+    INSERT INTO statistics.errors (command, type)
+    VALUES ($1, $2);
+""")
+upsert_shard = queries.add('statistics.upsert_shard', """
+    INSERT INTO statistics.shards (shard_id, guilds, members)
+    VALUES ($1, $2, $3)
+    ON CONFLICT (shard_id) DO UPDATE
+    SET guilds = EXCLUDED.guilds, members = EXCLUDED.members,
+        updated_at = now();
+""")
+insert_api_latency = queries.add('statistics.insert_api_latency', """
+    INSERT INTO statistics.api_latencies (latency)
+    VALUES ($1);
+""")
+insert_gateway_latency = queries.add('statistics.insert_gateway_latency', """
+    INSERT INTO statistics.gateway_latencies (shard_id, latency)
+    VALUES ($1, $2);
+""")
+insert_loop_lag = queries.add('statistics.insert_loop_lag', """
+    INSERT INTO statistics.loop_lags (
+        shard_id, p50, p90, p99, max, samples, stalls
+    )
+    VALUES ($1, $2, $3, $4, $5, $6, $7);
+""")
+insert_memory_sample = queries.add('statistics.insert_memory_sample', """
+    INSERT INTO statistics.memory_samples (shard_id, rss, blocks)
+    VALUES ($1, $2, $3);
+""")
+select_top_commands = queries.add('statistics.select_top_commands', """
+    SELECT command, uses, sum(uses) OVER () AS total
+    FROM statistics.command_uses
+    ORDER BY uses DESC LIMIT 5;
+""")
+select_today_count = queries.add('statistics.select_today_count', """
+    SELECT coalesce(sum(uses), 0)
+    FROM statistics.daily_command_uses
+    WHERE day = (now() AT TIME ZONE 'UTC')::date;
+""")
+lock_partitions = queries.add('statistics.lock_partitions', """
+    SELECT pg_advisory_xact_lock(hashtext('statistics.partitions'));
+""")
+create_partitions = queries.add('statistics.create_partitions', """
+    SELECT statistics.create_partitions(now(), now() + interval '2 months');
+""")
+drop_partitions = queries.add('statistics.drop_partitions', """
+    SELECT statistics.drop_partitions(make_interval(months => $1));
+""")
+# Every worker's shards, leaving out shards that no longer exist
+select_shard_counts = queries.add('statistics.select_shard_counts', """
+    SELECT coalesce(sum(guilds), 0), coalesce(sum(members), 0)
+    FROM statistics.shards
+    WHERE shard_id < $1;
+""")
 
 
 class Statistics:
 
     def __init__(self, bot):
         self.bot = bot
+        self.pool = bot.pools['statistics']
         self.stats_task = bot.loop.create_task(self.update_stats(delay=3600))
-        self.latency_task = bot.loop.create_task(self.update_latency(delay=60))
+        self.shards_task = bot.loop.create_task(self.update_shards(delay=60))
+        self.gateway_latency_task = bot.loop.create_task(
+            self.update_gateway_latency(delay=60))
+        # Work for the whole cluster is left to the worker with shard 0
+        self.primary = not bot.shard_ids or 0 in bot.shard_ids
+        if self.primary:
+            self.latency_task = bot.loop.create_task(
+                self.update_latency(delay=60))
+            self.partition_task = bot.loop.create_task(
+                self.manage_partitions(delay=86400))
+        else:
+            self.latency_task = self.partition_task = None
+        self.loop_lag_task = bot.loop.create_task(
+            self.update_loop_lag(delay=60))
+        self.memory_task = bot.loop.create_task(
+            self.update_memory(delay=300))
+        self._stats_cache = None
+
+        # Retention in months of the partitioned statistics
+        config = getattr(bot.config, 'statistics', None)
+        self.retention = getattr(config, 'retention', 12)
 
     def __unload(self):
         self.stats_task.cancel()
-        self.latency_task.cancel()
+        self.shards_task.cancel()
+        self.gateway_latency_task.cancel()
+        if self.primary:
+            self.latency_task.cancel()
+            self.partition_task.cancel()
+        self.loop_lag_task.cancel()
+        self.memory_task.cancel()
 
     async def update_stats(self, *, delay):
         await self.bot.wait_until_ready()
         while not self.bot.is_closed():
             url = f'https://discordbots.org/api/bots/{self.bot.user.id}/stats'
             headers = {'Authorization': self.bot.config.settings.dbl_token}
-            data = {'server_count': len(self.bot.guilds)}
-            await self.bot.session.post(url, headers=headers, data=data)
+            # Posted per shard so cluster workers don't overwrite each other
+            counts = collections.Counter(guild.shard_id
+                                         for guild in self.bot.guilds)
+            for shard_id in self.bot.shards:
+                data = {'server_count': counts[shard_id],
+                        'shard_id': shard_id,
+                        'shard_count': self.bot.shard_count}
+                await self.bot.session.post(url, headers=headers, data=data)
+            await asyncio.sleep(delay)
+
+    async def update_shards(self, *, delay):
+        await self.bot.wait_until_ready()
+        while not self.bot.is_closed():
+            guilds = collections.Counter()
+            members = collections.Counter()
+            for guild in self.bot.guilds:
+                guilds[guild.shard_id] += 1
+                members[guild.shard_id] += guild.member_count
+            records = [(shard_id, guilds[shard_id], members[shard_id])
+                       for shard_id in self.bot.shards]
+            await upsert_shard.executemany(self.pool, records)
             await asyncio.sleep(delay)
 
     async def update_latency(self, *, delay):
@@ -36,73 +172,125 @@ class Statistics:
             async with self.bot.session.get(url, headers=headers) as response:
                 end_time = time.perf_counter()
                 if response.status == 200:
-                    await self.bot.pool.execute("""
-                        INSERT INTO statistics.api_latencies (latency)
-                        VALUES ($1);
-                    """, end_time - start_time)
+                    await insert_api_latency.execute(
+                        self.pool, end_time - start_time)
             await asyncio.sleep(delay)
 
-    async def on_socket_response(self, response):
-        if not self.bot.is_connected():
-            return
-        if response.get('op') == self.bot.ws.HEARTBEAT_ACK:
-            await self.bot.pool.execute("""
-                INSERT INTO statistics.gateway_latencies (latency)
-                VALUES ($1);
-            """, self.bot.latency)
+    async def manage_partitions(self, *, delay):
+        # Not waiting for ready as the current partitions have to exist first
+        while not self.bot.is_closed():
+            try:
+                async with self.pool.acquire() as connection:
+                    async with connection.transaction():
+                        # Only one process at a time, even across deployments
+                        await lock_partitions.execute(connection)
+                        await create_partitions.execute(connection)
+                        await drop_partitions.execute(
+                            connection, self.retention)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Tried again next time, the partitions are made in advance
+                log.exception("Failed to manage the statistics partitions")
+            await asyncio.sleep(delay)
+
+    async def update_gateway_latency(self, *, delay):
+        # Heartbeat acks don't say which shard they're from, so sample
+        await self.bot.wait_until_connect()
+        while not self.bot.is_closed():
+            latencies = [(shard_id, latency)
+                         for shard_id, latency in self.bot.latencies
+                         if math.isfinite(latency) and latency > 0]
+            await insert_gateway_latency.executemany(self.pool, latencies)
+            await asyncio.sleep(delay)
+
+    async def update_loop_lag(self, *, delay):
+        # Lag is per process, so it's attributed to its first shard
+        shard_id = self.bot.shard_ids[0] if self.bot.shard_ids else 0
+        while not self.bot.is_closed():
+            await asyncio.sleep(delay)
+            lag = self.bot.monitor.collect()
+            if lag is None:
+                continue
+            await insert_loop_lag.execute(
+                self.pool, shard_id, lag['p50'], lag['p90'], lag['p99'],
+                lag['max'], lag['samples'], lag['stalls'])
+
+    def _get_rss(self):
+        try:
+            with open('/proc/self/statm') as file:
+                pages = int(file.read().split()[1])
+            return pages * resource.getpagesize()
+        except OSError:
+            # Only the peak is available elsewhere, in kilobytes on Linux
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    async def update_memory(self, *, delay):
+        shard_id = self.bot.shard_ids[0] if self.bot.shard_ids else 0
+        while not self.bot.is_closed():
+            # Blocks held by the object allocator, as walking every object
+            # with gc.get_objects() would stall the loop on a large heap
+            blocks = sys.getallocatedblocks()
+            await insert_memory_sample.execute(
+                self.pool, shard_id, self._get_rss(), blocks)
+            await asyncio.sleep(delay)
 
     async def on_command(self, ctx):
         ctx.id_event = asyncio.Event()
         guild_id = ctx.guild.id if ctx.guild is not None else None
+        shard_id = ctx.guild.shard_id if ctx.guild is not None else 0
         command = ctx.command.qualified_name
         cog = type(ctx.cog).__name__ if ctx.cog is not None else None
-        id = await self.bot.pool.fetchval("""
-            INSERT INTO statistics.commands (
-                user_id, channel_id, guild_id, command, cog
-            )
-            VALUES ($1, $2, $3, $4, $5)
-            RETURNING id;
-        """, ctx.author.id, ctx.channel.id, guild_id, command, cog)
-        ctx.command_id = id
+        record = await insert_command.fetchrow(
+            self.pool, ctx.author.id, ctx.channel.id, guild_id, shard_id,
+            command, cog)
+        ctx.command_id, ctx.command_used_at = record
         ctx.id_event.set()
 
     async def on_command_completion(self, ctx):
         await ctx.id_event.wait()
-        await self.bot.pool.execute("""
-            UPDATE statistics.commands
-            SET completed = TRUE
-            WHERE id = $1;
-        """, ctx.command_id)
+        trace = ctx.trace.finish(ctx.command.qualified_name)
+        summary = json.dumps(trace.summary()) if trace.spans else None
+        await complete_command.execute(
+            self.pool, ctx.command_id, ctx.command_used_at, summary)
 
     async def on_command_error(self, ctx, error):
         if isinstance(error, commands.CommandNotFound):
             return
         await ctx.id_event.wait()
-        await self.bot.pool.execute("""
-            INSERT INTO statistics.errors (command, type)
-            VALUES ($1, $2);
-        """, ctx.command_id, type(error).__name__)
+        await insert_error.execute(self.pool, ctx.command_id,
+                                   type(error).__name__)
+
+    async def _get_stats_fields(self):
+        records = await select_top_commands.fetch(self.bot.pool)
+        today_count = await select_today_count.fetchval(self.bot.pool)
+        guild_count, member_count = await select_shard_counts.fetchrow(
+            self.bot.pool, self.bot.shard_count)
+        command_count = records[0]['total'] if records else 0
+        general = '\n'.join([
+            f'Servers: **{guild_count}**',
+            f'Members: **{member_count}**',
+            f'Commands Used: **{command_count}**',
+            f'Commands Used Today: **{today_count}**'])
+        top_commands = '\n'.join(
+            f"{i}. **{record['command']}** ({record['uses']} uses)"
+            for i, record in enumerate(records, 1))
+        return [('General', general), ('Top Commands', top_commands)]
 
     @commands.group(invoke_without_command=True)
     @ignore
     async def stats(self, ctx):
         """List bot-wide statistics."""
-        records = await self.bot.pool.fetch("""
-            SELECT command, count(*)
-            FROM statistics.commands
-            GROUP BY command
-            ORDER BY count DESC;
-        """)
-        member_count = sum(guild.member_count for guild in self.bot.guilds)
-        command_count = sum(record['count'] for record in records)
+        if (self._stats_cache is None or
+                self._stats_cache[0] < time.monotonic()):
+            fields = await self._get_stats_fields()
+            self._stats_cache = (time.monotonic() + 60, fields)
+        else:
+            fields = self._stats_cache[1]
+
         embed = discord.Embed(title='Statistics', color=get_color(ctx))
-        embed.add_field(name='General', value='\n'.join([
-            f'Servers: **{len(self.bot.guilds)}**',
-            f'Members: **{member_count}**',
-            f'Commands Used: **{command_count}**']))
-        embed.add_field(name='Top Commands', value='\n'.join(
-            f"{i}. **{record['command']}** ({record['count']} uses)"
-            for i, record in enumerate(records[:5], 1)))
+        for name, value in fields:
+            embed.add_field(name=name, value=value)
         await ctx.send(embed=embed)
 
 
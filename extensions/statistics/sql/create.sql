@@ -1,26 +1,122 @@
 CREATE SCHEMA statistics
     CREATE TABLE commands (
-        id serial PRIMARY KEY,
+        id bigserial,
         user_id bigint NOT NULL,
         channel_id bigint NOT NULL,
         guild_id bigint,
+        shard_id integer DEFAULT 0 NOT NULL,
         command text NOT NULL,
         cog text DEFAULT NULL,
         completed boolean DEFAULT FALSE NOT NULL,
-        used_at timestamptz DEFAULT now() NOT NULL
+        trace jsonb DEFAULT NULL,
+        used_at timestamptz DEFAULT now() NOT NULL,
+        PRIMARY KEY (id, used_at)
+    ) PARTITION BY RANGE (used_at)
+    CREATE TABLE shards (
+        shard_id integer PRIMARY KEY,
+        guilds integer NOT NULL,
+        members integer NOT NULL,
+        updated_at timestamptz DEFAULT now() NOT NULL
     )
-    CREATE TABLE errors (
-        id serial PRIMARY KEY,
-        command integer REFERENCES commands NOT NULL,
-        type text NOT NULL
+    CREATE TABLE command_uses (
+        command text PRIMARY KEY,
+        uses bigint DEFAULT 0 NOT NULL
+    )
+    CREATE TABLE daily_command_uses (
+        day date,
+        command text,
+        uses bigint DEFAULT 0 NOT NULL,
+        PRIMARY KEY (day, command)
     )
+    CREATE TABLE errors (
+        id bigserial,
+        command bigint NOT NULL,
+        type text NOT NULL,
+        occurred_at timestamptz DEFAULT now() NOT NULL,
+        PRIMARY KEY (id, occurred_at)
+    ) PARTITION BY RANGE (occurred_at)
+    CREATE INDEX ON errors (command)
     CREATE TABLE api_latencies (
-        id serial PRIMARY KEY,
+        id bigserial,
         latency double precision NOT NULL CHECK (latency > 0),
-        measured_at timestamptz DEFAULT now() NOT NULL
-    )
+        measured_at timestamptz DEFAULT now() NOT NULL,
+        PRIMARY KEY (id, measured_at)
+    ) PARTITION BY RANGE (measured_at)
     CREATE TABLE gateway_latencies (
-        id serial PRIMARY KEY,
+        id bigserial,
+        shard_id integer DEFAULT 0 NOT NULL,
         latency double precision NOT NULL CHECK (latency > 0),
-        measured_at timestamptz DEFAULT now() NOT NULL
-    );
+        measured_at timestamptz DEFAULT now() NOT NULL,
+        PRIMARY KEY (id, measured_at)
+    ) PARTITION BY RANGE (measured_at)
+    CREATE TABLE loop_lags (
+        id bigserial,
+        shard_id integer DEFAULT 0 NOT NULL,
+        p50 double precision NOT NULL,
+        p90 double precision NOT NULL,
+        p99 double precision NOT NULL,
+        max double precision NOT NULL,
+        samples integer NOT NULL,
+        stalls integer NOT NULL,
+        measured_at timestamptz DEFAULT now() NOT NULL,
+        PRIMARY KEY (id, measured_at)
+    ) PARTITION BY RANGE (measured_at)
+    CREATE TABLE memory_samples (
+        id bigserial,
+        shard_id integer DEFAULT 0 NOT NULL,
+        rss bigint NOT NULL,
+        blocks bigint NOT NULL,
+        measured_at timestamptz DEFAULT now() NOT NULL,
+        PRIMARY KEY (id, measured_at)
+    ) PARTITION BY RANGE (measured_at);
+
+CREATE FUNCTION statistics.create_partitions(since timestamptz,
+                                             until timestamptz)
+RETURNS void AS $$
+DECLARE
+    parent text;
+    month timestamp;
+BEGIN
+    FOR parent IN
+        SELECT pg_class.relname
+        FROM pg_partitioned_table
+        JOIN pg_class ON pg_class.oid = pg_partitioned_table.partrelid
+        JOIN pg_namespace ON pg_namespace.oid = pg_class.relnamespace
+        WHERE pg_namespace.nspname = 'statistics'
+    LOOP
+        month := date_trunc('month', since AT TIME ZONE 'UTC');
+        WHILE month <= until AT TIME ZONE 'UTC' LOOP
+            EXECUTE format(
+                'CREATE TABLE IF NOT EXISTS statistics.%I '
+                'PARTITION OF statistics.%I FOR VALUES FROM (%L) TO (%L)',
+                parent || '_' || to_char(month, 'YYYYMM'), parent,
+                month AT TIME ZONE 'UTC',
+                (month + interval '1 month') AT TIME ZONE 'UTC');
+            month := month + interval '1 month';
+        END LOOP;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION statistics.drop_partitions(retention interval)
+RETURNS SETOF text AS $$
+DECLARE
+    partition text;
+BEGIN
+    FOR partition IN
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_namespace ON pg_namespace.oid = parent.relnamespace
+        WHERE pg_namespace.nspname = 'statistics'
+        AND to_date(right(child.relname, 6), 'YYYYMM') + interval '1 month'
+            <= (now() - retention) AT TIME ZONE 'UTC'
+    LOOP
+        EXECUTE format('DROP TABLE statistics.%I', partition);
+        RETURN NEXT partition;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT statistics.create_partitions(now(), now() + interval '2 months');
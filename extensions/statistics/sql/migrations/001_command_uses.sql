@@ -0,0 +1,10 @@
+CREATE TABLE statistics.command_uses (
+    command text PRIMARY KEY,
+    uses bigint DEFAULT 0 NOT NULL
+);
+CREATE TABLE statistics.daily_command_uses (
+    day date,
+    command text,
+    uses bigint DEFAULT 0 NOT NULL,
+    PRIMARY KEY (day, command)
+);
@@ -0,0 +1,126 @@
+ALTER TABLE statistics.commands RENAME TO commands_old;
+ALTER SEQUENCE statistics.commands_id_seq RENAME TO commands_old_id_seq;
+ALTER TABLE statistics.errors RENAME TO errors_old;
+ALTER SEQUENCE statistics.errors_id_seq RENAME TO errors_old_id_seq;
+ALTER TABLE statistics.api_latencies RENAME TO api_latencies_old;
+ALTER SEQUENCE statistics.api_latencies_id_seq
+    RENAME TO api_latencies_old_id_seq;
+ALTER TABLE statistics.gateway_latencies RENAME TO gateway_latencies_old;
+ALTER SEQUENCE statistics.gateway_latencies_id_seq
+    RENAME TO gateway_latencies_old_id_seq;
+
+CREATE TABLE statistics.commands (
+    id bigserial,
+    user_id bigint NOT NULL,
+    channel_id bigint NOT NULL,
+    guild_id bigint,
+    command text NOT NULL,
+    cog text DEFAULT NULL,
+    completed boolean DEFAULT FALSE NOT NULL,
+    used_at timestamptz DEFAULT now() NOT NULL,
+    PRIMARY KEY (id, used_at)
+) PARTITION BY RANGE (used_at);
+CREATE TABLE statistics.errors (
+    id bigserial,
+    command bigint NOT NULL,
+    type text NOT NULL,
+    occurred_at timestamptz DEFAULT now() NOT NULL,
+    PRIMARY KEY (id, occurred_at)
+) PARTITION BY RANGE (occurred_at);
+CREATE INDEX ON statistics.errors (command);
+CREATE TABLE statistics.api_latencies (
+    id bigserial,
+    latency double precision NOT NULL CHECK (latency > 0),
+    measured_at timestamptz DEFAULT now() NOT NULL,
+    PRIMARY KEY (id, measured_at)
+) PARTITION BY RANGE (measured_at);
+CREATE TABLE statistics.gateway_latencies (
+    id bigserial,
+    latency double precision NOT NULL CHECK (latency > 0),
+    measured_at timestamptz DEFAULT now() NOT NULL,
+    PRIMARY KEY (id, measured_at)
+) PARTITION BY RANGE (measured_at);
+
+CREATE FUNCTION statistics.create_partitions(since timestamptz,
+                                             until timestamptz)
+RETURNS void AS $$
+DECLARE
+    parent text;
+    month timestamp;
+BEGIN
+    FOREACH parent IN ARRAY ARRAY[
+        'commands', 'errors', 'api_latencies', 'gateway_latencies'
+    ] LOOP
+        month := date_trunc('month', since AT TIME ZONE 'UTC');
+        WHILE month <= until AT TIME ZONE 'UTC' LOOP
+            EXECUTE format(
+                'CREATE TABLE IF NOT EXISTS statistics.%I '
+                'PARTITION OF statistics.%I FOR VALUES FROM (%L) TO (%L)',
+                parent || '_' || to_char(month, 'YYYYMM'), parent,
+                month AT TIME ZONE 'UTC',
+                (month + interval '1 month') AT TIME ZONE 'UTC');
+            month := month + interval '1 month';
+        END LOOP;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION statistics.drop_partitions(retention interval)
+RETURNS SETOF text AS $$
+DECLARE
+    partition text;
+BEGIN
+    FOR partition IN
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_namespace ON pg_namespace.oid = parent.relnamespace
+        WHERE pg_namespace.nspname = 'statistics'
+        AND to_date(right(child.relname, 6), 'YYYYMM') + interval '1 month'
+            <= (now() - retention) AT TIME ZONE 'UTC'
+    LOOP
+        EXECUTE format('DROP TABLE statistics.%I', partition);
+        RETURN NEXT partition;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT statistics.create_partitions(
+    least(
+        (SELECT min(used_at) FROM statistics.commands_old),
+        (SELECT min(measured_at) FROM statistics.api_latencies_old),
+        (SELECT min(measured_at) FROM statistics.gateway_latencies_old),
+        now()
+    ),
+    now() + interval '2 months');
+
+INSERT INTO statistics.commands
+SELECT id, user_id, channel_id, guild_id, command, cog, completed, used_at
+FROM statistics.commands_old;
+INSERT INTO statistics.errors (id, command, type, occurred_at)
+SELECT errors_old.id, errors_old.command, errors_old.type,
+       commands_old.used_at
+FROM statistics.errors_old
+JOIN statistics.commands_old ON commands_old.id = errors_old.command;
+INSERT INTO statistics.api_latencies
+SELECT id, latency, measured_at FROM statistics.api_latencies_old;
+INSERT INTO statistics.gateway_latencies
+SELECT id, latency, measured_at FROM statistics.gateway_latencies_old;
+
+SELECT setval('statistics.commands_id_seq',
+              coalesce(max(id), 0) + 1, FALSE)
+FROM statistics.commands;
+SELECT setval('statistics.errors_id_seq', coalesce(max(id), 0) + 1, FALSE)
+FROM statistics.errors;
+SELECT setval('statistics.api_latencies_id_seq',
+              coalesce(max(id), 0) + 1, FALSE)
+FROM statistics.api_latencies;
+SELECT setval('statistics.gateway_latencies_id_seq',
+              coalesce(max(id), 0) + 1, FALSE)
+FROM statistics.gateway_latencies;
+
+DROP TABLE statistics.errors_old;
+DROP TABLE statistics.commands_old;
+DROP TABLE statistics.api_latencies_old;
+DROP TABLE statistics.gateway_latencies_old;
@@ -0,0 +1,4 @@
+ALTER TABLE statistics.commands
+    ADD COLUMN shard_id integer DEFAULT 0 NOT NULL;
+ALTER TABLE statistics.gateway_latencies
+    ADD COLUMN shard_id integer DEFAULT 0 NOT NULL;
@@ -0,0 +1 @@
+ALTER TABLE statistics.commands ADD COLUMN trace jsonb DEFAULT NULL;
@@ -0,0 +1,43 @@
+CREATE TABLE statistics.loop_lags (
+    id bigserial,
+    shard_id integer DEFAULT 0 NOT NULL,
+    p50 double precision NOT NULL,
+    p90 double precision NOT NULL,
+    p99 double precision NOT NULL,
+    max double precision NOT NULL,
+    samples integer NOT NULL,
+    stalls integer NOT NULL,
+    measured_at timestamptz DEFAULT now() NOT NULL,
+    PRIMARY KEY (id, measured_at)
+) PARTITION BY RANGE (measured_at);
+
+-- Cover every partitioned table instead of a fixed list
+CREATE OR REPLACE FUNCTION statistics.create_partitions(since timestamptz,
+                                                        until timestamptz)
+RETURNS void AS $$
+DECLARE
+    parent text;
+    month timestamp;
+BEGIN
+    FOR parent IN
+        SELECT pg_class.relname
+        FROM pg_partitioned_table
+        JOIN pg_class ON pg_class.oid = pg_partitioned_table.partrelid
+        JOIN pg_namespace ON pg_namespace.oid = pg_class.relnamespace
+        WHERE pg_namespace.nspname = 'statistics'
+    LOOP
+        month := date_trunc('month', since AT TIME ZONE 'UTC');
+        WHILE month <= until AT TIME ZONE 'UTC' LOOP
+            EXECUTE format(
+                'CREATE TABLE IF NOT EXISTS statistics.%I '
+                'PARTITION OF statistics.%I FOR VALUES FROM (%L) TO (%L)',
+                parent || '_' || to_char(month, 'YYYYMM'), parent,
+                month AT TIME ZONE 'UTC',
+                (month + interval '1 month') AT TIME ZONE 'UTC');
+            month := month + interval '1 month';
+        END LOOP;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT statistics.create_partitions(now(), now() + interval '2 months');
@@ -0,0 +1,10 @@
+CREATE TABLE statistics.memory_samples (
+    id bigserial,
+    shard_id integer DEFAULT 0 NOT NULL,
+    rss bigint NOT NULL,
+    blocks bigint NOT NULL,
+    measured_at timestamptz DEFAULT now() NOT NULL,
+    PRIMARY KEY (id, measured_at)
+) PARTITION BY RANGE (measured_at);
+
+SELECT statistics.create_partitions(now(), now() + interval '2 months');
@@ -0,0 +1,6 @@
+CREATE TABLE statistics.shards (
+    shard_id integer PRIMARY KEY,
+    guilds integer NOT NULL,
+    members integer NOT NULL,
+    updated_at timestamptz DEFAULT now() NOT NULL
+);
@@ -1,15 +1,138 @@
+import asyncio
+import datetime
 import enum
+import functools
+import hashlib
+import logging
+import time
 import types
 
 import asyncpg
 import discord
 from discord.ext import commands
 
-from utils import acquire, cache, confirm
+from utils import acquire, cache, confirm, queries
 
 from .checks import not_automated
+from .scheduler import BulkEdit
 from .transliterator import is_unicode, transliterate
-from .utils import MemberDefaultDict
+from .utils import BatchQueue, MemberDefaultDict
+
+
+log = logging.getLogger(__name__)
+
+select_config = queries.add('transliteration.get_config', """
+    SELECT * FROM transliteration.guilds WHERE id = $1;
+""")
+insert_transliteration = queries.add(
+    'transliteration.insert_transliteration', """
+    INSERT INTO transliteration.transliterations (
+        user_id, guild_id, type, original, manual
+    )
+    VALUES ($1, $2, $3, $4, $5);
+""")
+select_transliteration = queries.add(
+    'transliteration.select_transliteration', """
+    SELECT type, original, created_at
+    FROM transliteration.current_transliterations
+    WHERE user_id = $1 AND guild_id = $2;
+""")
+select_unignored_at = queries.add('transliteration.select_unignored_at', """
+    SELECT unignored_at
+    FROM transliteration.current_nicknames
+    WHERE user_id = $1 AND guild_id = $2;
+""")
+insert_user = queries.add('transliteration.insert_user', """
+    INSERT INTO transliteration.users (id)
+    VALUES ($1);
+""")
+select_username = queries.add('transliteration.select_username', """
+    SELECT username
+    FROM transliteration.current_usernames
+    WHERE user_id = $1;
+""")
+insert_username = queries.add('transliteration.insert_username', """
+    INSERT INTO transliteration.usernames (user_id, username)
+    VALUES ($1, $2);
+""")
+insert_member = queries.add('transliteration.insert_member', """
+    INSERT INTO transliteration.members (user_id, guild_id)
+    VALUES ($1, $2);
+""")
+select_nickname = queries.add('transliteration.select_nickname', """
+    SELECT nickname
+    FROM transliteration.current_nicknames
+    WHERE user_id = $1 AND guild_id = $2;
+""")
+insert_nickname = queries.add('transliteration.insert_nickname', """
+    INSERT INTO transliteration.nicknames (
+        user_id, guild_id, nickname
+    )
+    VALUES ($1, $2, $3);
+""")
+select_revert_plan = queries.add('transliteration.select_revert_plan', """
+    SELECT current.user_id, current.type, current.original
+    FROM transliteration.current_transliterations AS current
+    LEFT JOIN transliteration.current_nicknames AS nickname
+    USING (user_id, guild_id)
+    WHERE current.guild_id = $1
+    AND (nickname.unignored_at IS NULL OR
+         current.created_at > nickname.unignored_at);
+""")
+insert_guilds = queries.add('transliteration.insert_guilds', """
+    INSERT INTO transliteration.guilds (id)
+    SELECT unnest($1::bigint[])
+    ON CONFLICT DO NOTHING;
+""")
+insert_usernames = queries.add('transliteration.insert_usernames', """
+    INSERT INTO transliteration.usernames (user_id, username, created_at)
+    SELECT history.*
+    FROM unnest($1::bigint[], $2::varchar[], $3::timestamptz[])
+        AS history (user_id, username, created_at)
+    JOIN transliteration.users ON users.id = history.user_id
+    ORDER BY history.created_at;
+""")
+insert_nicknames = queries.add('transliteration.insert_nicknames', """
+    INSERT INTO transliteration.nicknames (
+        user_id, guild_id, nickname, ignore, created_at
+    )
+    SELECT history.*
+    FROM unnest($1::bigint[], $2::bigint[], $3::varchar[], $4::boolean[],
+                $5::timestamptz[])
+        AS history (user_id, guild_id, nickname, ignore, created_at)
+    JOIN transliteration.members USING (user_id, guild_id)
+    ORDER BY history.created_at;
+""")
+insert_job = queries.add('transliteration.insert_job', """
+    INSERT INTO transliteration.jobs (
+        guild_id, type, channel_id, message_id, reason
+    )
+    VALUES ($1, $2, $3, $4, $5);
+""")
+select_jobs = queries.add('transliteration.select_jobs', """
+    SELECT * FROM transliteration.jobs;
+""")
+delete_job = queries.add('transliteration.delete_job', """
+    DELETE FROM transliteration.jobs WHERE guild_id = $1;
+""")
+select_fingerprints = queries.add('transliteration.select_fingerprints', """
+    SELECT user_id, fingerprint
+    FROM transliteration.fingerprints
+    WHERE guild_id = $1;
+""")
+upsert_fingerprint = queries.add('transliteration.upsert_fingerprint', """
+    INSERT INTO transliteration.fingerprints (
+        user_id, guild_id, fingerprint
+    )
+    VALUES ($1, $2, $3)
+    ON CONFLICT (user_id, guild_id) DO UPDATE
+    SET fingerprint = EXCLUDED.fingerprint;
+""")
+update_automate = queries.add('transliteration.update_automate', """
+    UPDATE transliteration.guilds
+    SET automate = $1
+    WHERE id = $2;
+""")
 
 
 class TransliterationType(enum.Enum):
@@ -18,11 +141,24 @@ class TransliterationType(enum.Enum):
     NICKNAME = 'nickname'
 
 
+class JobType(enum.Enum):
+
+    TRANSLITERATE = 'transliterate'
+    REVERT = 'revert'
+
+
 class Transliteration:
 
     def __init__(self, bot):
         self.bot = bot
-        self._recent_edits = MemberDefaultDict(list, track=True)
+        self._recent_edits = MemberDefaultDict(list, track=True,
+                                                name='recent_edits')
+        self.jobs = {}
+        self.reconcile_task = None
+        self.history = BatchQueue(self._write_history, name='history')
+        # Kept below the size of the background pool
+        config = getattr(bot.config, 'transliteration', None)
+        self.concurrency = getattr(config, 'concurrency', 5)
 
     def __local_check(self, ctx):
         if ctx.guild is None:
@@ -35,8 +171,13 @@ class Transliteration:
         return True
 
     def __unload(self):
-        for tracker in self._recent_edits.trackers:
-            tracker.cancel()
+        self._recent_edits.close()
+        if self.reconcile_task is not None:
+            self.reconcile_task.cancel()
+        self.bot.loop.create_task(self.history.close())
+        # Left in the database to be resumed once loaded again
+        for job in self.jobs.values():
+            job.task.cancel()
 
     async def transliterate_member(self, member, *, reason=None, manual=False,
                                    connection):
@@ -58,122 +199,276 @@ class Transliteration:
             type = TransliterationType.NICKNAME
         else:
             type = TransliterationType.USERNAME
-        await connection.execute("""
-            INSERT INTO transliteration.transliterations (
-                user_id, guild_id, type, original, manual
-            )
-            VALUES ($1, $2, $3, $4, $5);
-        """, member.id, member.guild.id, type, member.display_name, manual)
+        await insert_transliteration.execute(
+            connection, member.id, member.guild.id, type, member.display_name,
+            manual)
 
-        self._recent_edits[member].append(member.display_name)
-        await member.edit(nick=transliteration[:32], reason=reason)
+        await self._edit_member(member, transliteration[:32], reason=reason)
+        return transliteration[:32]
 
     async def revert_member(self, member, *, reason=None, connection):
         if member.nick is None or is_unicode(member.nick):
             return
 
-        record = await connection.fetchrow("""
-            SELECT type, original, created_at
-            FROM transliteration.transliterations
-            WHERE user_id = $1 AND guild_id = $2
-            ORDER BY created_at DESC LIMIT 1;
-        """, member.id, member.guild.id)
+        record = await select_transliteration.fetchrow(
+            connection, member.id, member.guild.id)
         if record is None:
             return
         type, original, trans_date = record
-        nick_date = await connection.fetchval("""
-            SELECT created_at
-            FROM transliteration.nicknames
-            WHERE user_id = $1 AND guild_id = $2 AND ignore = FALSE
-            ORDER BY created_at DESC LIMIT 1;
-        """, member.id, member.guild.id)
+        nick_date = await select_unignored_at.fetchval(
+            connection, member.id, member.guild.id)
 
         if nick_date is None or trans_date > nick_date:
-            self._recent_edits[member].append(member.display_name)
             if type is TransliterationType.NICKNAME:
-                await member.edit(nick=original, reason=reason)
+                await self._edit_member(member, original, reason=reason)
             else:
-                await member.edit(nick=None, reason=reason)
+                await self._edit_member(member, None, reason=reason)
+
+    async def _edit_member(self, member, nick, *, reason=None):
+        self._recent_edits.append(member, member.display_name)
+        await member.edit(nick=nick, reason=reason)
+
+    async def plan_revert(self, guild, *, connection):
+        # Looks up the whole guild at once instead of querying per member
+        records = await select_revert_plan.fetch(connection, guild.id)
+
+        plan = []
+        for user_id, type, original in records:
+            member = guild.get_member(user_id)
+            if member is None or member.nick is None:
+                continue
+            if is_unicode(member.nick):
+                continue
+            if type is TransliterationType.NICKNAME:
+                plan.append((member, original))
+            else:
+                plan.append((member, None))
+        return plan
 
     @cache(maxsize=None, ignore=['connection'])
     async def get_config(self, guild, *, connection):
-        record = await connection.fetchrow("""
-            SELECT * FROM transliteration.guilds WHERE id = $1;
-        """, guild.id)
+        record = await select_config.fetchrow(connection, guild.id)
         return types.SimpleNamespace(**record)
 
-    async def _add_guild(self, guild, *, connection):
-        await connection.execute("""
-            INSERT INTO transliteration.guilds (id)
-            VALUES ($1)
-            ON CONFLICT DO NOTHING;
-        """, guild.id)
-
     async def _add_member(self, member, *, connection):
         try:
-            await connection.execute("""
-                INSERT INTO transliteration.users (id)
-                VALUES ($1);
-            """, member.id)
+            await insert_user.execute(connection, member.id)
         except asyncpg.UniqueViolationError:
-            username = await connection.fetchval("""
-                SELECT username
-                FROM transliteration.usernames
-                WHERE user_id = $1
-                ORDER BY created_at DESC LIMIT 1;
-            """, member.id)
+            username = await select_username.fetchval(connection, member.id)
             add_username = username is None or member.name != username
         else:
             add_username = True
         if add_username:
-            await connection.execute("""
-                INSERT INTO transliteration.usernames (user_id, username)
-                VALUES ($1, $2);
-            """, member.id, member.name)
+            await insert_username.execute(connection, member.id, member.name)
 
         try:
-            await connection.execute("""
-                INSERT INTO transliteration.members (user_id, guild_id)
-                VALUES ($1, $2);
-            """, member.id, member.guild.id)
+            await insert_member.execute(connection, member.id, member.guild.id)
         except asyncpg.UniqueViolationError:
             if member.nick is not None:
-                nickname = await connection.fetchval("""
-                    SELECT nickname
-                    FROM transliteration.nicknames
-                    WHERE user_id = $1 AND guild_id = $2
-                    ORDER BY created_at DESC LIMIT 1;
-                """, member.id, member.guild.id)
+                nickname = await select_nickname.fetchval(
+                    connection, member.id, member.guild.id)
                 add_nickname = nickname is None or member.nick != nickname
             else:
                 add_nickname = False
         else:
             add_nickname = member.nick is not None
         if add_nickname:
+            await insert_nickname.execute(
+                connection, member.id, member.guild.id, member.nick)
+
+    async def _sync_members(self, guilds, *, connection):
+        start_time = time.perf_counter()
+        records = [(member.id, guild.id, member.name, member.nick)
+                   for guild in guilds for member in guild.members]
+        async with connection.transaction():
+            # Left inline, as the snapshot table only exists in this
+            # transaction and so can't be prepared ahead of time
+            await connection.execute("""
+                CREATE TEMPORARY TABLE member_snapshot (
+                    user_id bigint NOT NULL,
+                    guild_id bigint NOT NULL,
+                    username varchar(32) NOT NULL,
+                    nickname varchar(32)
+                ) ON COMMIT DROP;
+            """)
+            await connection.copy_records_to_table(
+                'member_snapshot', records=records)
+            # Temporary tables aren't analyzed automatically
+            await connection.execute("""
+                ANALYZE member_snapshot;
+            """)
+
+            await insert_guilds.execute(
+                connection, [guild.id for guild in guilds])
+            await connection.execute("""
+                INSERT INTO transliteration.users (id)
+                SELECT DISTINCT user_id FROM member_snapshot
+                ON CONFLICT DO NOTHING;
+            """)
+            await connection.execute("""
+                INSERT INTO transliteration.usernames (user_id, username)
+                SELECT snapshot.user_id, snapshot.username
+                FROM (
+                    SELECT DISTINCT ON (user_id) user_id, username
+                    FROM member_snapshot
+                ) AS snapshot
+                LEFT JOIN transliteration.current_usernames AS current
+                USING (user_id)
+                WHERE current.username IS DISTINCT FROM snapshot.username;
+            """)
+            await connection.execute("""
+                INSERT INTO transliteration.members (user_id, guild_id)
+                SELECT user_id, guild_id FROM member_snapshot
+                ON CONFLICT DO NOTHING;
+            """)
             await connection.execute("""
                 INSERT INTO transliteration.nicknames (
                     user_id, guild_id, nickname
                 )
-                VALUES ($1, $2, $3);
-            """, member.id, member.guild.id, member.nick)
+                SELECT snapshot.user_id, snapshot.guild_id, snapshot.nickname
+                FROM member_snapshot AS snapshot
+                LEFT JOIN transliteration.current_nicknames AS current
+                USING (user_id, guild_id)
+                WHERE snapshot.nickname IS NOT NULL
+                AND current.nickname IS DISTINCT FROM snapshot.nickname;
+            """)
+        log.info("Synced %d members of %d guilds in %.2fs", len(records),
+                 len(guilds), time.perf_counter() - start_time)
+
+    async def start_job(self, guild, type, *, channel, reason, message=None):
+        if guild.id in self.jobs:
+            raise commands.CheckFailure
+
+        pool = self.bot.pools['background']
+        if type is JobType.TRANSLITERATE:
+            edits = [functools.partial(self.transliterate_member, member,
+                                       reason=reason, manual=True,
+                                       connection=pool)
+                     for member in guild.members
+                     if is_unicode(member.display_name)]
+        else:
+            plan = await self.plan_revert(guild, connection=pool)
+            edits = [functools.partial(self._edit_member, member, nick,
+                                       reason=reason)
+                     for member, nick in plan]
+
+        if message is None:
+            message = await channel.send("Starting...")
+            await insert_job.execute(pool, guild.id, type.value, channel.id,
+                                     message.id, reason)
+
+        job = BulkEdit(edits, concurrency=self.concurrency)
+        self.jobs[guild.id] = job
+        job.start(loop=self.bot.loop)
+        self.bot.loop.create_task(self._report_job(guild, type, job, message))
+
+    async def _report_job(self, guild, type, job, message):
+        if type is JobType.TRANSLITERATE:
+            ongoing, finished = "Transliterating", "Transliterated"
+        else:
+            ongoing, finished = "Reverting", "Reverted"
 
-    @acquire()
-    async def on_ready(self, connection):
+        def progress():
+            failed = f" ({job.failed} failed)" if job.failed else ""
+            return f"{job.done}/{job.total} members{failed}"
+
+        async def edit(content):
+            try:
+                await message.edit(content=content)
+            except discord.HTTPException:
+                pass
+
+        try:
+            while not job.task.done():
+                await edit(f"{ongoing} {progress()}...")
+                await asyncio.wait([job.task], timeout=5)
+        finally:
+            del self.jobs[guild.id]
+
+        if not job.task.cancelled():
+            error = job.task.exception()
+            if error is not None:
+                # Kept in the database so it's resumed once ready again
+                log.error("Job in guild %d failed", guild.id, exc_info=error)
+                await edit(f"Failed after {progress()}, will retry later.")
+                return
+            content = f"{finished} {progress()}."
+        elif job.cancelled:
+            content = f"Cancelled after {progress()}."
+        else:
+            return
+        await delete_job.execute(self.bot.pools['background'], guild.id)
+        await edit(content)
+
+    async def _resume_jobs(self, *, connection):
+        records = await select_jobs.fetch(connection)
+        for record in records:
+            guild = self.bot.get_guild(record['guild_id'])
+            if guild is None or guild.id in self.jobs:
+                continue
+            channel = guild.get_channel(record['channel_id'])
+            message = None
+            if channel is not None:
+                try:
+                    message = await channel.get_message(record['message_id'])
+                except discord.HTTPException:
+                    pass
+            if message is None:
+                await delete_job.execute(connection, guild.id)
+                continue
+            await self.start_job(guild, JobType(record['type']),
+                                 channel=channel, reason=record['reason'],
+                                 message=message)
+
+    def _fingerprint(self, member, nick):
+        data = '\0'.join([member.name, nick or '']).encode()
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    @acquire(pool='background')
+    async def reconcile(self, connection):
+        start_time = time.perf_counter()
+        checked = 0
         for guild in self.bot.guilds:
-            await self._add_guild(guild, connection=connection)
             config = await self.get_config(guild, connection=connection)
+            if not config.automate:
+                continue
+
+            records = await select_fingerprints.fetch(connection, guild.id)
+            fingerprints = dict(records)
+            changes = []
             for member in guild.members:
-                await self._add_member(member, connection=connection)
-                if config.automate:
-                    reason = "Automatic transliteration"
-                    await self.transliterate_member(
+                fingerprint = self._fingerprint(member, member.nick)
+                if fingerprints.get(member.id) == fingerprint:
+                    continue
+                checked += 1
+                reason = "Automatic transliteration"
+                try:
+                    nick = await self.transliterate_member(
                         member, reason=reason, connection=connection)
-
-    @acquire()
+                except discord.HTTPException:
+                    # Left unfingerprinted so it's retried on the next start
+                    continue
+                # Fingerprint the name we leave the member with
+                if nick is not None:
+                    fingerprint = self._fingerprint(member, nick)
+                changes.append((member.id, guild.id, fingerprint))
+
+            await upsert_fingerprint.executemany(connection, changes)
+        log.info("Reconciled %d changed members in %.2fs", checked,
+                 time.perf_counter() - start_time)
+
+    @acquire(pool='background')
+    async def on_ready(self, connection):
+        await self._sync_members(self.bot.guilds, connection=connection)
+        await self._resume_jobs(connection=connection)
+        # Reconnects can fire this again while still reconciling
+        if self.reconcile_task is not None:
+            self.reconcile_task.cancel()
+        self.reconcile_task = self.bot.loop.create_task(self.reconcile())
+
+    @acquire(pool='background')
     async def on_guild_join(self, guild, connection):
-        await self._add_guild(guild, connection=connection)
-        for member in guild.members:
-            await self._add_member(member, connection=connection)
+        await self._sync_members([guild], connection=connection)
 
     @acquire()
     async def on_member_join(self, member, connection):
@@ -184,49 +479,55 @@ class Transliteration:
             await self.transliterate_member(
                 member, reason=reason, connection=connection)
 
+    async def _write_history(self, items):
+        usernames = [item[1:] for item in items if item[0] == 'username']
+        nicknames = [item[1:] for item in items if item[0] == 'nickname']
+        async with self.bot.pools['background'].acquire() as connection:
+            # Names of users or members that aren't stored yet are skipped
+            if usernames:
+                await insert_usernames.execute(
+                    connection, *map(list, zip(*usernames)))
+            if nicknames:
+                await insert_nicknames.execute(
+                    connection, *map(list, zip(*nicknames)))
+
     async def on_member_update(self, before, after):
         name_change = after.name != before.name
         nick_change = after.nick != before.nick
         if not (name_change or nick_change):
             return
 
-        async with self.bot.pool.acquire() as connection:
-            if name_change:
-                await connection.execute("""
-                    INSERT INTO transliteration.usernames (user_id, username)
-                    VALUES ($1, $2);
-                """, after.id, after.name)
-            if nick_change and after.nick is not None:
-                edits = self._recent_edits[before]
-                try:
-                    edits.remove(before.display_name)
-                except ValueError:
-                    ignore = False
-                else:
-                    ignore = True
-                if not edits:
-                    del self._recent_edits[before]
-                await connection.execute("""
-                    INSERT INTO transliteration.nicknames (
-                        user_id, guild_id, nickname, ignore
-                    )
-                    VALUES ($1, $2, $3, $4);
-                """, after.id, after.guild.id, after.nick, ignore)
-
-            if after.display_name != before.display_name:
-                config = await self.get_config(after.guild,
-                                               connection=connection)
-                if config.automate:
-                    if nick_change:
-                        if after.nick is not None:
-                            change = "nickname change"
-                        else:
-                            change = "nickname remove"
+        # History is written in batches, so keep the time of the change
+        now = datetime.datetime.now(datetime.timezone.utc)
+        if name_change:
+            await self.history.put(('username', after.id, after.name, now))
+        if nick_change and after.nick is not None:
+            edits = self._recent_edits[before]
+            try:
+                edits.remove(before.display_name)
+            except ValueError:
+                ignore = False
+            else:
+                ignore = True
+            if not edits:
+                del self._recent_edits[before]
+            await self.history.put(('nickname', after.id, after.guild.id,
+                                    after.nick, ignore, now))
+
+        if after.display_name != before.display_name:
+            config = await self.get_config(after.guild,
+                                           connection=self.bot.pool)
+            if config.automate:
+                if nick_change:
+                    if after.nick is not None:
+                        change = "nickname change"
                     else:
-                        change = "username change"
-                    reason = f"Automatic transliteration on {change}"
-                    await self.transliterate_member(
-                        after, reason=reason, connection=connection)
+                        change = "nickname remove"
+                else:
+                    change = "username change"
+                reason = f"Automatic transliteration on {change}"
+                await self.transliterate_member(
+                    after, reason=reason, connection=self.bot.pool)
 
     @commands.group(invoke_without_command=True)
     @acquire(command=True)
@@ -239,13 +540,11 @@ class Transliteration:
     @transliterate.command(name='all')
     @commands.has_permissions(manage_guild=True)
     @confirm()
-    @acquire(command=True)
     async def transliterate_all(self, ctx):
         """Transliterate all members' names."""
-        for member in ctx.guild.members:
-            reason = "Mass transliteration by {0} ({0.id})".format(ctx.author)
-            await self.transliterate_member(
-                member, reason=reason, manual=True, connection=ctx.connection)
+        reason = "Mass transliteration by {0} ({0.id})".format(ctx.author)
+        await self.start_job(ctx.guild, JobType.TRANSLITERATE,
+                             channel=ctx.channel, reason=reason)
 
     @commands.group(invoke_without_command=True)
     @not_automated
@@ -260,24 +559,27 @@ class Transliteration:
     @commands.has_permissions(manage_guild=True)
     @not_automated
     @confirm()
-    @acquire(command=True)
     async def revert_all(self, ctx):
         """Revert the transliterations of all members' names."""
-        for member in ctx.guild.members:
-            reason = ("Mass transliteration revert by {0} ({0.id})"
-                      .format(ctx.author))
-            await self.revert_member(
-                member, reason=reason, connection=ctx.connection)
+        reason = ("Mass transliteration revert by {0} ({0.id})"
+                  .format(ctx.author))
+        await self.start_job(ctx.guild, JobType.REVERT, channel=ctx.channel,
+                             reason=reason)
+
+    @commands.command()
+    @commands.has_permissions(manage_guild=True)
+    async def cancel(self, ctx):
+        """Cancel the running mass transliteration or revert."""
+        job = self.jobs.get(ctx.guild.id)
+        if job is None:
+            raise commands.BadArgument
+        job.cancel()
 
     @commands.command()
     @commands.has_permissions(manage_guild=True)
     async def automate(self, ctx, toggle: bool):
         """Configure transliterations to be done automatically."""
-        await ctx.pool.execute("""
-            UPDATE transliteration.guilds
-            SET automate = $1
-            WHERE id = $2;
-        """, toggle, ctx.guild.id)
+        await update_automate.execute(ctx.pool, toggle, ctx.guild.id)
         self.get_config.invalidate(ctx.guild)
 
         command = self.transliterate_all if toggle else self.revert_all
@@ -289,6 +591,12 @@ def setup(bot):
     bot.add_cog(Transliteration(bot))
 
 
+async def close(bot):
+    cog = bot.get_cog('Transliteration')
+    if cog is not None:
+        await cog.history.close()
+
+
 async def init_connection(bot, connection):
     import operator
     await connection.set_type_codec(
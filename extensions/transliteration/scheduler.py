@@ -0,0 +1,69 @@
+import asyncio
+import collections
+import logging
+import time
+
+import discord
+
+
+log = logging.getLogger(__name__)
+
+
+class RateLimiter:
+
+    def __init__(self, rate, per):
+        self.rate = rate
+        self.per = per
+        self._calls = collections.deque()
+
+    async def wait(self):
+        while True:
+            now = time.monotonic()
+            while self._calls and now - self._calls[0] >= self.per:
+                self._calls.popleft()
+            if len(self._calls) < self.rate:
+                self._calls.append(now)
+                return
+            await asyncio.sleep(self._calls[0] + self.per - now)
+
+
+class BulkEdit:
+
+    # Member edits share a per-guild bucket of roughly 10 per 10 seconds
+    def __init__(self, edits, *, rate=10, per=10, concurrency=5):
+        self.edits = edits
+        self.total = len(edits)
+        self.done = 0
+        self.failed = 0
+        self.cancelled = False
+        self.limiter = RateLimiter(rate, per)
+        self.concurrency = concurrency
+        self.task = None
+
+    def start(self, *, loop):
+        self.task = loop.create_task(self.run())
+        return self.task
+
+    def cancel(self):
+        self.cancelled = True
+        self.task.cancel()
+
+    async def run(self):
+        edits = iter(self.edits)
+
+        async def worker():
+            # Workers share the iterator so every edit is only done once
+            for edit in edits:
+                await self.limiter.wait()
+                try:
+                    await edit()
+                except discord.HTTPException:
+                    self.failed += 1
+                except Exception:
+                    # One bad member shouldn't end the whole run
+                    self.failed += 1
+                    log.exception("Failed to edit a member")
+                self.done += 1
+
+        workers = [worker() for _ in range(self.concurrency)]
+        await asyncio.gather(*workers)
@@ -36,4 +36,107 @@ CREATE SCHEMA transliteration
         manual boolean NOT NULL,
         created_at timestamptz DEFAULT now() NOT NULL,
         FOREIGN KEY (user_id, guild_id) REFERENCES members (user_id, guild_id)
-    );
+    )
+    CREATE TABLE current_usernames (
+        user_id bigint PRIMARY KEY REFERENCES users ON DELETE CASCADE,
+        username varchar(32) NOT NULL,
+        created_at timestamptz NOT NULL
+    )
+    CREATE TABLE current_nicknames (
+        user_id bigint,
+        guild_id bigint,
+        nickname varchar(32) NOT NULL,
+        created_at timestamptz NOT NULL,
+        unignored_at timestamptz,
+        PRIMARY KEY (user_id, guild_id),
+        FOREIGN KEY (user_id, guild_id) REFERENCES members (user_id, guild_id)
+            ON DELETE CASCADE
+    )
+    CREATE TABLE current_transliterations (
+        user_id bigint,
+        guild_id bigint,
+        type transliteration_type NOT NULL,
+        original varchar(32) NOT NULL,
+        manual boolean NOT NULL,
+        created_at timestamptz NOT NULL,
+        PRIMARY KEY (user_id, guild_id),
+        FOREIGN KEY (user_id, guild_id) REFERENCES members (user_id, guild_id)
+            ON DELETE CASCADE
+    )
+    CREATE TABLE fingerprints (
+        user_id bigint,
+        guild_id bigint,
+        fingerprint bytea NOT NULL,
+        PRIMARY KEY (user_id, guild_id),
+        FOREIGN KEY (user_id, guild_id) REFERENCES members (user_id, guild_id)
+            ON DELETE CASCADE
+    )
+    CREATE TABLE jobs (
+        guild_id bigint PRIMARY KEY REFERENCES guilds ON DELETE CASCADE,
+        type text NOT NULL CHECK (type IN ('transliterate', 'revert')),
+        channel_id bigint NOT NULL,
+        message_id bigint NOT NULL,
+        reason text NOT NULL,
+        created_at timestamptz DEFAULT now() NOT NULL
+    )
+    CREATE INDEX ON usernames (user_id, created_at DESC)
+    CREATE INDEX ON nicknames (user_id, guild_id, created_at DESC)
+    CREATE INDEX ON transliterations (user_id, guild_id, created_at DESC);
+
+CREATE FUNCTION transliteration.update_current_username()
+RETURNS trigger AS $$
+BEGIN
+    INSERT INTO transliteration.current_usernames (
+        user_id, username, created_at
+    )
+    VALUES (NEW.user_id, NEW.username, NEW.created_at)
+    ON CONFLICT (user_id) DO UPDATE
+    SET username = EXCLUDED.username, created_at = EXCLUDED.created_at
+    WHERE current_usernames.created_at <= EXCLUDED.created_at;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION transliteration.update_current_nickname()
+RETURNS trigger AS $$
+BEGIN
+    INSERT INTO transliteration.current_nicknames (
+        user_id, guild_id, nickname, created_at, unignored_at
+    )
+    VALUES (NEW.user_id, NEW.guild_id, NEW.nickname, NEW.created_at,
+            CASE WHEN NEW.ignore THEN NULL ELSE NEW.created_at END)
+    ON CONFLICT (user_id, guild_id) DO UPDATE
+    SET nickname = EXCLUDED.nickname, created_at = EXCLUDED.created_at,
+        unignored_at = coalesce(EXCLUDED.unignored_at,
+                                current_nicknames.unignored_at)
+    WHERE current_nicknames.created_at <= EXCLUDED.created_at;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION transliteration.update_current_transliteration()
+RETURNS trigger AS $$
+BEGIN
+    INSERT INTO transliteration.current_transliterations (
+        user_id, guild_id, type, original, manual, created_at
+    )
+    VALUES (NEW.user_id, NEW.guild_id, NEW.type, NEW.original, NEW.manual,
+            NEW.created_at)
+    ON CONFLICT (user_id, guild_id) DO UPDATE
+    SET type = EXCLUDED.type, original = EXCLUDED.original,
+        manual = EXCLUDED.manual, created_at = EXCLUDED.created_at
+    WHERE current_transliterations.created_at <= EXCLUDED.created_at;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER update_current_username
+    AFTER INSERT ON transliteration.usernames
+    FOR EACH ROW EXECUTE PROCEDURE transliteration.update_current_username();
+CREATE TRIGGER update_current_nickname
+    AFTER INSERT ON transliteration.nicknames
+    FOR EACH ROW EXECUTE PROCEDURE transliteration.update_current_nickname();
+CREATE TRIGGER update_current_transliteration
+    AFTER INSERT ON transliteration.transliterations
+    FOR EACH ROW
+    EXECUTE PROCEDURE transliteration.update_current_transliteration();
@@ -0,0 +1,117 @@
+LOCK TABLE transliteration.usernames, transliteration.nicknames,
+    transliteration.transliterations IN SHARE MODE;
+
+CREATE TABLE transliteration.current_usernames (
+    user_id bigint PRIMARY KEY
+        REFERENCES transliteration.users ON DELETE CASCADE,
+    username varchar(32) NOT NULL,
+    created_at timestamptz NOT NULL
+);
+CREATE TABLE transliteration.current_nicknames (
+    user_id bigint,
+    guild_id bigint,
+    nickname varchar(32) NOT NULL,
+    created_at timestamptz NOT NULL,
+    unignored_at timestamptz,
+    PRIMARY KEY (user_id, guild_id),
+    FOREIGN KEY (user_id, guild_id)
+        REFERENCES transliteration.members (user_id, guild_id)
+        ON DELETE CASCADE
+);
+CREATE TABLE transliteration.current_transliterations (
+    user_id bigint,
+    guild_id bigint,
+    type transliteration_type NOT NULL,
+    original varchar(32) NOT NULL,
+    manual boolean NOT NULL,
+    created_at timestamptz NOT NULL,
+    PRIMARY KEY (user_id, guild_id),
+    FOREIGN KEY (user_id, guild_id)
+        REFERENCES transliteration.members (user_id, guild_id)
+        ON DELETE CASCADE
+);
+
+CREATE INDEX ON transliteration.usernames (user_id, created_at DESC);
+CREATE INDEX ON transliteration.nicknames
+    (user_id, guild_id, created_at DESC);
+CREATE INDEX ON transliteration.transliterations
+    (user_id, guild_id, created_at DESC);
+
+CREATE FUNCTION transliteration.update_current_username()
+RETURNS trigger AS $$
+BEGIN
+    INSERT INTO transliteration.current_usernames (
+        user_id, username, created_at
+    )
+    VALUES (NEW.user_id, NEW.username, NEW.created_at)
+    ON CONFLICT (user_id) DO UPDATE
+    SET username = EXCLUDED.username, created_at = EXCLUDED.created_at
+    WHERE current_usernames.created_at <= EXCLUDED.created_at;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION transliteration.update_current_nickname()
+RETURNS trigger AS $$
+BEGIN
+    INSERT INTO transliteration.current_nicknames (
+        user_id, guild_id, nickname, created_at, unignored_at
+    )
+    VALUES (NEW.user_id, NEW.guild_id, NEW.nickname, NEW.created_at,
+            CASE WHEN NEW.ignore THEN NULL ELSE NEW.created_at END)
+    ON CONFLICT (user_id, guild_id) DO UPDATE
+    SET nickname = EXCLUDED.nickname, created_at = EXCLUDED.created_at,
+        unignored_at = coalesce(EXCLUDED.unignored_at,
+                                current_nicknames.unignored_at)
+    WHERE current_nicknames.created_at <= EXCLUDED.created_at;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION transliteration.update_current_transliteration()
+RETURNS trigger AS $$
+BEGIN
+    INSERT INTO transliteration.current_transliterations (
+        user_id, guild_id, type, original, manual, created_at
+    )
+    VALUES (NEW.user_id, NEW.guild_id, NEW.type, NEW.original, NEW.manual,
+            NEW.created_at)
+    ON CONFLICT (user_id, guild_id) DO UPDATE
+    SET type = EXCLUDED.type, original = EXCLUDED.original,
+        manual = EXCLUDED.manual, created_at = EXCLUDED.created_at
+    WHERE current_transliterations.created_at <= EXCLUDED.created_at;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER update_current_username
+    AFTER INSERT ON transliteration.usernames
+    FOR EACH ROW EXECUTE PROCEDURE transliteration.update_current_username();
+CREATE TRIGGER update_current_nickname
+    AFTER INSERT ON transliteration.nicknames
+    FOR EACH ROW EXECUTE PROCEDURE transliteration.update_current_nickname();
+CREATE TRIGGER update_current_transliteration
+    AFTER INSERT ON transliteration.transliterations
+    FOR EACH ROW
+    EXECUTE PROCEDURE transliteration.update_current_transliteration();
+
+INSERT INTO transliteration.current_usernames (user_id, username, created_at)
+SELECT DISTINCT ON (user_id) user_id, username, created_at
+FROM transliteration.usernames
+ORDER BY user_id, created_at DESC, id DESC;
+INSERT INTO transliteration.current_nicknames (
+    user_id, guild_id, nickname, created_at, unignored_at
+)
+SELECT DISTINCT ON (user_id, guild_id)
+    user_id, guild_id, nickname, created_at,
+    max(created_at) FILTER (WHERE NOT ignore)
+        OVER (PARTITION BY user_id, guild_id)
+FROM transliteration.nicknames
+ORDER BY user_id, guild_id, created_at DESC, id DESC;
+INSERT INTO transliteration.current_transliterations (
+    user_id, guild_id, type, original, manual, created_at
+)
+SELECT DISTINCT ON (user_id, guild_id)
+    user_id, guild_id, type, original, manual, created_at
+FROM transliteration.transliterations
+ORDER BY user_id, guild_id, created_at DESC, id DESC;
@@ -0,0 +1,9 @@
+CREATE TABLE transliteration.jobs (
+    guild_id bigint PRIMARY KEY
+        REFERENCES transliteration.guilds ON DELETE CASCADE,
+    type text NOT NULL CHECK (type IN ('transliterate', 'revert')),
+    channel_id bigint NOT NULL,
+    message_id bigint NOT NULL,
+    reason text NOT NULL,
+    created_at timestamptz DEFAULT now() NOT NULL
+);
@@ -0,0 +1,9 @@
+CREATE TABLE transliteration.fingerprints (
+    user_id bigint,
+    guild_id bigint,
+    fingerprint bytea NOT NULL,
+    PRIMARY KEY (user_id, guild_id),
+    FOREIGN KEY (user_id, guild_id)
+        REFERENCES transliteration.members (user_id, guild_id)
+        ON DELETE CASCADE
+);
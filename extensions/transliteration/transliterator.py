@@ -1,7 +1,24 @@
+import functools
+
 import unidecode
 
 
+class _Replacements(dict):
+
+    # Filled in lazily as str.translate looks up each new codepoint
+    def __missing__(self, codepoint):
+        replacement = unidecode.unidecode_expect_nonascii(chr(codepoint))
+        if '[?]' in replacement:
+            replacement = None
+        self[codepoint] = replacement
+        return replacement
+
+
+_replacements = _Replacements()
+
+
 def is_unicode(string):
+    # str.isascii is only available from 3.7
     try:
         string.encode('ascii')
     except UnicodeEncodeError:
@@ -10,9 +27,14 @@ def is_unicode(string):
         return False
 
 
+@functools.lru_cache(maxsize=4096)
+def _transliterate(string):
+    return string.translate(_replacements)
+
+
 def transliterate(string, *, check=True):
-    if check and not is_unicode(string):
+    # ASCII transliterates to itself regardless of check
+    if not is_unicode(string):
         return string
 
-    transliteration = map(unidecode.unidecode_expect_nonascii, string)
-    return ''.join(char for char in transliteration if '[?]' not in char)
+    return _transliterate(string)
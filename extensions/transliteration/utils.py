@@ -1,16 +1,52 @@
 import asyncio
 import collections
+import logging
 import warnings
 
 import discord
 
+from utils.metrics import registry
+
+
+log = logging.getLogger(__name__)
+
+expired_items = registry.counter(
+    'member_dict_expired_total', "Items removed before being consumed",
+    ['dict'])
+queue_enqueued = registry.counter(
+    'batch_queue_enqueued_total', "Items put in a batch queue", ['queue'])
+queue_written = registry.counter(
+    'batch_queue_written_total', "Items written from a batch queue",
+    ['queue'])
+queue_dropped = registry.counter(
+    'batch_queue_dropped_total', "Items dropped by failed batch writes",
+    ['queue'])
+queue_blocked = registry.counter(
+    'batch_queue_blocked_total', "Puts that waited on a full batch queue",
+    ['queue'])
+queue_depth = registry.gauge(
+    'batch_queue_depth', "Items waiting in a batch queue", ['queue'])
+queue_max_depth = registry.gauge(
+    'batch_queue_max_depth', "Most items ever waiting in a batch queue",
+    ['queue'])
+
+# Marks a deadline for a whole value rather than one appended item
+_WHOLE = object()
+
 
 class MemberDefaultDict(collections.defaultdict):
 
-    def __init__(self, *args, track=False, **kwargs):
+    def __init__(self, *args, track=False, timeout=60, name=None, **kwargs):
         super().__init__(*args, **kwargs)
         self.track = track
-        self.trackers = []
+        self.timeout = timeout
+        self.name = name
+        self.expired = 0
+        # Every entry lives equally long so deadlines are always in order
+        self._deadlines = collections.deque()
+        self._tracker = None
+        if name is not None:
+            registry.add_collector(('member_dict', name), self._collect)
 
     def __getitem__(self, member):
         key = self._get_key(member)
@@ -21,10 +57,19 @@ class MemberDefaultDict(collections.defaultdict):
         super().__setitem__(key, value)
 
         if self.track:
-            loop = asyncio.get_event_loop()
-            tracker = loop.create_task(self._track_item(key, value))
-            tracker.add_done_callback(self.trackers.remove)
-            self.trackers.append(tracker)
+            self._add_deadline(key, value, _WHOLE)
+
+    # Each item gets its own deadline, unlike items appended to self[member]
+    def append(self, member, item):
+        key = self._get_key(member)
+        value = dict.get(self, key)
+        if value is None:
+            value = self.default_factory()
+            super().__setitem__(key, value)
+        value.append(item)
+
+        if self.track:
+            self._add_deadline(key, value, item)
 
     def __delitem__(self, member):
         key = self._get_key(member)
@@ -34,14 +79,126 @@ class MemberDefaultDict(collections.defaultdict):
         key = self._get_key(member)
         return super().__contains__(key)
 
+    def close(self):
+        if self._tracker is not None:
+            self._tracker.cancel()
+        key = ('member_dict', self.name)
+        if registry.collectors.get(key) == self._collect:
+            registry.remove_collector(key)
+
+    def _collect(self):
+        expired_items.set(self.expired, self.name)
+
+    def _add_deadline(self, key, value, item):
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + self.timeout
+        self._deadlines.append((deadline, key, value, item))
+        if self._tracker is None or self._tracker.done():
+            self._tracker = loop.create_task(self._track_items())
+
     def _get_key(self, member):
         if isinstance(member, discord.Member):
             return (member.id, member.guild.id)
         else:
             return member
 
-    async def _track_item(self, key, value):
-        await asyncio.sleep(60)
-        if key in self and value in self[key]:
-            warnings.warn(f"Potential memory leak from value {value!r} in key "
+    async def _track_items(self):
+        loop = asyncio.get_event_loop()
+        while self._deadlines:
+            deadline, key, value, item = self._deadlines[0]
+            if deadline > loop.time():
+                await asyncio.sleep(deadline - loop.time())
+                continue
+            self._deadlines.popleft()
+
+            # Only remove the value if it hasn't been replaced since
+            if dict.get(self, key) is not value:
+                continue
+            if item is _WHOLE:
+                super().__delitem__(key)
+                if value:
+                    self.expired += len(value)
+                    warnings.warn(f"Removed unconsumed value {value!r} in "
+                                  f"key {key!r}", ResourceWarning)
+                continue
+
+            try:
+                value.remove(item)
+            except ValueError:
+                continue  # Already consumed
+            self.expired += 1
+            if not value:
+                super().__delitem__(key)
+            warnings.warn(f"Removed unconsumed item {item!r} in key "
                           f"{key!r}", ResourceWarning)
+
+
+class BatchQueue:
+
+    def __init__(self, write, *, maxsize=10000, batch_size=500, interval=1,
+                 name=None):
+        self.write = write
+        self.name = name
+        self.queue = asyncio.Queue(maxsize)
+        self.batch_size = batch_size
+        self.interval = interval
+        # Backpressure metrics
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.max_depth = 0
+        self.task = asyncio.get_event_loop().create_task(self._run())
+        if name is not None:
+            registry.add_collector(('batch_queue', name), self._collect)
+
+    @property
+    def depth(self):
+        return self.queue.qsize()
+
+    async def put(self, item):
+        if self.queue.full():
+            self.blocked += 1
+        await self.queue.put(item)
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    def _collect(self):
+        queue_enqueued.set(self.enqueued, self.name)
+        queue_written.set(self.written, self.name)
+        queue_dropped.set(self.dropped, self.name)
+        queue_blocked.set(self.blocked, self.name)
+        queue_depth.set(self.depth, self.name)
+        queue_max_depth.set(self.max_depth, self.name)
+
+    async def close(self):
+        # A reloaded cog may already have registered its own under the name
+        key = ('batch_queue', self.name)
+        if registry.collectors.get(key) == self._collect:
+            registry.remove_collector(key)
+        if not self.task.done():
+            # Items ahead of the sentinel still get written
+            await self.queue.put(None)
+        await self.task
+
+    async def _run(self):
+        closing = False
+        while not closing:
+            batch = [await self.queue.get()]
+            # Give bursts a moment to accumulate into one write
+            await asyncio.sleep(self.interval)
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            if None in batch:
+                closing = True
+                batch = batch[:batch.index(None)]
+            if not batch:
+                continue
+
+            try:
+                await self.write(batch)
+            except Exception:
+                self.dropped += len(batch)
+                log.exception("Dropped a batch of %d items", len(batch))
+            else:
+                self.written += len(batch)
@@ -0,0 +1,43 @@
+import argparse
+import asyncio
+
+import asyncpg
+
+
+async def backfill_statistics(args):
+    connection = await asyncpg.connect(args.dsn)
+    try:
+        async with connection.transaction():
+            # Block new commands so the recount can't miss or double count any
+            await connection.execute("""
+                LOCK TABLE statistics.commands IN SHARE MODE;
+            """)
+            await connection.execute("""
+                INSERT INTO statistics.command_uses (command, uses)
+                SELECT command, count(*)
+                FROM statistics.commands
+                GROUP BY command
+                ON CONFLICT (command) DO UPDATE
+                SET uses = EXCLUDED.uses;
+            """)
+            await connection.execute("""
+                INSERT INTO statistics.daily_command_uses (day, command, uses)
+                SELECT (used_at AT TIME ZONE 'UTC')::date, command, count(*)
+                FROM statistics.commands
+                GROUP BY 1, 2
+                ON CONFLICT (day, command) DO UPDATE
+                SET uses = EXCLUDED.uses;
+            """)
+    finally:
+        await connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('dsn')
+    args = parser.parse_args()
+    asyncio.get_event_loop().run_until_complete(backfill_statistics(args))
+
+
+if __name__ == '__main__':
+    main()
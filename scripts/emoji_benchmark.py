@@ -0,0 +1,129 @@
+import argparse
+import importlib.util
+import operator
+import os
+import random
+import re
+import sys
+import timeit
+
+
+WORDS = ['hello', 'there', 'what', 'is', 'this', 'lol', 'nice', 'ok', 'gg',
+         'see', 'you', 'tomorrow', 'thanks', 'for', 'the', 'help']
+
+
+def load_emoji():
+    # Loaded from its path to avoid importing utils along with discord
+    here = os.path.dirname(os.path.abspath(__file__))
+    path = os.path.join(here, os.pardir, 'utils', 'emoji')
+    spec = importlib.util.spec_from_file_location(
+        'emoji', os.path.join(path, '__init__.py'),
+        submodule_search_locations=[path])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['emoji'] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def old_convert(Emoji, text):
+    text = list(text)
+    start = 0
+    pattern = re.compile(':([a-z0-9_+-]+):')
+    while True:
+        match = pattern.search(''.join(text), start)
+        if match is None:
+            break
+        start, end = match.span()
+        try:
+            text[start:end] = str(Emoji[match.group(1)])
+        except KeyError:
+            pass
+        start += 1
+    return ''.join(text)
+
+
+def old_parse(Emoji, text):
+    text = list(text)
+    positions = {}
+    emojis = sorted(Emoji, key=lambda emoji: len(str(emoji)), reverse=True)
+    for emoji in emojis:
+        value = emoji.value
+        while True:
+            position = ''.join(text).find(value)
+            if position != -1:
+                positions[position] = emoji
+                length = len(value)
+                text[position:position + length] = ' ' * length
+            else:
+                break
+    return list(dict(sorted(positions.items(),
+                            key=operator.itemgetter(0))).values())
+
+
+def make_message(rng, Emoji, length):
+    names = list(Emoji.__members__)
+    emojis = list(Emoji)
+    parts = []
+    while sum(map(len, parts)) < length:
+        kind = rng.random()
+        if kind < 0.6:
+            parts.append(rng.choice(WORDS) + ' ')
+        elif kind < 0.8:
+            emoji = rng.choice(emojis)
+            if emoji.diverse and rng.random() < 0.5:
+                emoji = getattr(emoji, rng.choice(['light', 'dark']))
+            parts.append(str(emoji))
+        elif kind < 0.95:
+            parts.append(f':{rng.choice(names)}:')
+        else:
+            # Unknown shortcodes and stray colons
+            parts.append(rng.choice([':nope:', ':', '::', 'a:b:c ']))
+    return ''.join(parts)[:length]
+
+
+def emoji_benchmark(args):
+    module = load_emoji()
+    Emoji = module.Emoji
+    rng = random.Random(args.seed)
+    messages = [make_message(rng, Emoji, args.length)
+                for _ in range(args.messages)]
+
+    mismatches = 0
+    for message in messages:
+        for name, old, new in [
+                ('convert', old_convert(Emoji, message),
+                 module.convert(message)),
+                ('parse', old_parse(Emoji, message), module.parse(message))]:
+            if old != new:
+                mismatches += 1
+                print(f"{name} mismatch for {message!r}")
+    print(f"{len(messages)} messages checked, {mismatches} mismatches")
+
+    for label, func in [
+            ('old convert', lambda: [old_convert(Emoji, message)
+                                     for message in messages]),
+            ('new convert', lambda: [module.convert(message)
+                                     for message in messages]),
+            ('old parse', lambda: [old_parse(Emoji, message)
+                                   for message in messages]),
+            ('new parse', lambda: [module.parse(message)
+                                   for message in messages])]:
+        timings = timeit.repeat(func, number=1, repeat=args.repeat)
+        print(f"{label}: {min(timings) * 1000 / len(messages):.3f}ms "
+              f"per {args.length} character message")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--messages', type=int, default=20)
+    parser.add_argument('-l', '--length', type=int, default=2000)
+    parser.add_argument('-r', '--repeat', type=int, default=3)
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    args = parser.parse_args()
+    if emoji_benchmark(args):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
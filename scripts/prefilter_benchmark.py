@@ -0,0 +1,93 @@
+import argparse
+import os
+import random
+import sys
+import timeit
+import types
+
+from discord.ext import commands
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+from bot import compile_prefixes
+
+
+USER_ID = 432533456807919639
+WORDS = ['hello', 'lol', 'anyone', 'there', 'ok', 'gg', 'what', 'is', 'this',
+         'nice']
+
+
+def make_messages(rng, *, count, guilds, command_ratio):
+    prefixes = {id: rng.choice([None, '!', '?', 'a!', '>>'])
+                for id in range(guilds)}
+    messages = []
+    for _ in range(count):
+        guild_id = rng.randrange(guilds)
+        prefix = prefixes[guild_id]
+        words = rng.choices(WORDS, k=rng.randint(1, 12))
+        content = ' '.join(words)
+        if rng.random() < command_ratio:
+            if prefix is not None and rng.random() < 0.8:
+                content = f'{prefix}convert {content}'
+            else:
+                content = f'<@{USER_ID}> convert {content}'
+        guild = types.SimpleNamespace(id=guild_id)
+        messages.append(types.SimpleNamespace(content=content, guild=guild))
+    return prefixes, messages
+
+
+def prefilter_benchmark(args):
+    rng = random.Random(args.seed)
+    prefixes, messages = make_messages(
+        rng, count=args.messages, guilds=args.guilds,
+        command_ratio=args.command_ratio)
+    bot = types.SimpleNamespace(user=types.SimpleNamespace(id=USER_ID))
+    compiled = {id: compile_prefixes(prefix, USER_ID)
+                for id, prefix in prefixes.items()}
+
+    def resolve(message):
+        # What process_commands does before it can discard a message, less
+        # building the context and scheduling the coroutine
+        prefix = prefixes[message.guild.id]
+        if prefix is not None:
+            return commands.when_mentioned_or(prefix)(bot, message)
+        else:
+            return commands.when_mentioned(bot, message)
+
+    def run_old():
+        matches = 0
+        for message in messages:
+            for prefix in resolve(message):
+                if message.content.startswith(prefix):
+                    matches += 1
+                    break
+        return matches
+
+    def run_new():
+        matches = 0
+        for message in messages:
+            if message.content.startswith(compiled[message.guild.id]):
+                matches += 1
+        return matches
+
+    assert run_old() == run_new()
+    for label, func in [('prefix resolution', run_old),
+                        ('prefilter', run_new)]:
+        timings = timeit.repeat(func, number=1, repeat=args.repeat)
+        per_message = min(timings) / len(messages) * 1e9
+        print(f"{label}: {min(timings) * 1000:.2f}ms per "
+              f"{len(messages)} messages ({per_message:.0f}ns each)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--messages', type=int, default=100000)
+    parser.add_argument('-g', '--guilds', type=int, default=1000)
+    parser.add_argument('-c', '--command-ratio', type=float, default=0.01)
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    args = parser.parse_args()
+    prefilter_benchmark(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+
+
+here = os.path.dirname(os.path.abspath(__file__))
+root = os.path.normpath(os.path.join(here, os.pardir))
+
+TARGETS = [
+    ('cli', [os.path.join(root, '__main__.py'), 'db', '--help']),
+    ('utils', ['-c', 'import utils']),
+    ('bot', ['-c', 'import bot']),
+]
+line_regex = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def measure(argv):
+    start_time = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', *argv],
+                             cwd=root, stdout=subprocess.DEVNULL,
+                             stderr=subprocess.PIPE,
+                             universal_newlines=True)
+    wall_time = time.perf_counter() - start_time
+    if process.returncode != 0:
+        return None
+
+    total = 0
+    top_level = []
+    for line in process.stderr.splitlines():
+        match = line_regex.match(line)
+        if match is None:
+            continue
+        own, cumulative, indent, name = match.groups()
+        total += int(own)
+        # Packages imported directly rather than by another import
+        if len(indent) == 1:
+            top_level.append((int(cumulative), name))
+    top_level.sort(reverse=True)
+    return wall_time, total / 1000, top_level
+
+
+def startup_benchmark(args):
+    failed = False
+    for label, argv in TARGETS:
+        results = [measure(argv) for _ in range(args.repeat)]
+        if None in results:
+            print(f"{label}: failed to run, are the requirements installed?")
+            failed = True
+            continue
+
+        wall_time, total, top_level = min(results)
+        print(f"{label}: {total:.1f}ms importing, {wall_time * 1000:.1f}ms "
+              f"in total")
+        for cumulative, name in top_level[:args.top]:
+            print(f"  {cumulative / 1000:8.1f}ms {name}")
+        if args.max_ms is not None and total > args.max_ms:
+            print(f"{label}: over the {args.max_ms}ms limit")
+            failed = True
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-t', '--top', type=int, default=5)
+    parser.add_argument('-m', '--max-ms', type=float)
+    args = parser.parse_args()
+    if startup_benchmark(args):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+import argparse
+import importlib.util
+import os
+import random
+import timeit
+
+import unidecode
+
+
+STYLES = [
+    # Offsets into the Mathematical Alphanumeric Symbols block
+    lambda char: chr(0x1D400 + ord(char) - ord('a') + 26),  # Bold
+    lambda char: chr(0x1D4EA + ord(char) - ord('a')),  # Bold script
+    lambda char: chr(0x1D586 + ord(char) - ord('a')),  # Bold fraktur
+    lambda char: chr(0x1D5EE + ord(char) - ord('a')),  # Sans-serif bold
+    lambda char: chr(0xFF41 + ord(char) - ord('a')),  # Fullwidth
+    lambda char: chr(0x24D0 + ord(char) - ord('a')),  # Circled
+]
+SCRIPTS = [
+    'Иван', 'Наташа', 'Αλέξανδρος', 'Σοφία', '田中太郎', '王小明', 'さくら',
+    'カタカナ', '김민준', 'محمد', 'יעקב', 'Zoë', 'Ångström', 'Łukasz',
+    'Ñoño', 'Þórr', 'Đặng', 'ภาษาไทย', 'हिन्दी',
+]
+DECORATIONS = [
+    ('✨', '✨'), ('꧁', '꧂'), ('『', '』'), ('★', '★'), ('☆彡', ''),
+    ('', ' 🎮'), ('🔥', ''), ('•', '•'), ('ツ', ''), ('', ' ♡'),
+]
+WORDS = ['shadow', 'night', 'pixel', 'storm', 'wolf', 'cat', 'ghost',
+         'moon', 'sky', 'blade', 'frost', 'echo', 'nova', 'rain']
+
+
+def load_transliterator():
+    # Loaded from its path to avoid importing the whole cog with discord
+    here = os.path.dirname(os.path.abspath(__file__))
+    path = os.path.join(here, os.pardir, 'extensions', 'transliteration',
+                        'transliterator.py')
+    spec = importlib.util.spec_from_file_location('transliterator', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def old_is_unicode(string):
+    try:
+        string.encode('ascii')
+    except UnicodeEncodeError:
+        return True
+    else:
+        return False
+
+
+def old_transliterate(string, *, check=True):
+    if check and not old_is_unicode(string):
+        return string
+
+    transliteration = map(unidecode.unidecode_expect_nonascii, string)
+    return ''.join(char for char in transliteration if '[?]' not in char)
+
+
+def make_name(rng):
+    kind = rng.random()
+    word = rng.choice(WORDS)
+    if kind < 0.5:
+        # Most names are plain ASCII
+        name = word.capitalize() + str(rng.randrange(1000))
+    elif kind < 0.7:
+        style = rng.choice(STYLES)
+        name = ''.join(map(style, word))
+    elif kind < 0.85:
+        name = rng.choice(SCRIPTS)
+    elif kind < 0.95:
+        prefix, suffix = rng.choice(DECORATIONS)
+        name = prefix + word + suffix
+    else:
+        # Zalgo text
+        marks = [chr(rng.randrange(0x300, 0x370)) for _ in range(3)]
+        name = ''.join(char + ''.join(marks) for char in word)
+    return name[:32]
+
+
+def transliteration_benchmark(args):
+    module = load_transliterator()
+    rng = random.Random(args.seed)
+    # Names repeat across guilds, so draw from a smaller pool
+    pool = [make_name(rng) for _ in range(args.unique)]
+    corpus = [rng.choice(pool) for _ in range(args.size)]
+
+    mismatches = 0
+    for name in set(corpus):
+        for check in (True, False):
+            old = (old_is_unicode(name), old_transliterate(name, check=check))
+            new = (module.is_unicode(name),
+                   module.transliterate(name, check=check))
+            if old != new:
+                mismatches += 1
+                print(f"Mismatch for {name!r}: {old!r} != {new!r}")
+    print(f"{len(set(corpus))} unique names checked, {mismatches} mismatches")
+
+    def run_old():
+        for name in corpus:
+            if old_is_unicode(name):
+                old_transliterate(name)
+
+    def run_new():
+        for name in corpus:
+            if module.is_unicode(name):
+                module.transliterate(name)
+
+    for label, func in [('old', run_old), ('new', run_new)]:
+        timings = timeit.repeat(func, number=1, repeat=args.repeat)
+        print(f"{label}: {min(timings) * 1000:.2f}ms per {len(corpus)} names")
+
+    module._transliterate.cache_clear()
+    cold = timeit.timeit(run_new, number=1)
+    print(f"new (empty LRU): {cold * 1000:.2f}ms per {len(corpus)} names")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--size', type=int, default=50000)
+    parser.add_argument('-u', '--unique', type=int, default=20000)
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    args = parser.parse_args()
+    if transliteration_benchmark(args):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,10 @@
 from .checks import *
 from .context import *
+from .cooldowns import *
 from .decorators import *
 from .emoji import *
+from .monitor import *
+from .query import *
+from .tracing import *
 from .utils import *
+from .waiters import *
@@ -4,6 +4,7 @@ import enum
 from discord.ext import commands
 
 from .emoji import Emoji
+from .tracing import Trace
 
 
 class Action(enum.Enum):
@@ -17,6 +18,8 @@ class Context(commands.Context):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.pool = self.bot.pool
+        # Shared by the copies made when invoking other commands
+        self.trace = Trace()
 
     async def confirm(self, question=None, *, command=None):
         question = "Are you sure you want to" if question is None else question
@@ -29,11 +32,10 @@ class Context(commands.Context):
             await message.add_reaction(emoji)
 
         def check(reaction, user):
-            return (reaction.message.id == message.id and
-                    user == self.author and reaction.emoji in emojis)
+            return user == self.author and reaction.emoji in emojis
         try:
-            reaction, _ = await self.bot.wait_for(
-                'reaction_add', timeout=30, check=check)
+            reaction, _ = await self.bot.waiters.wait_for(
+                'reaction_add', message, timeout=30, check=check)
         except asyncio.TimeoutError:
             return False
         else:
@@ -91,11 +93,13 @@ class Context(commands.Context):
                     def check_(reaction_, user):
                         return (check(reaction_, user) and
                                 reaction_.emoji == reaction.emoji)
-                    await self.bot.wait_for('reaction_remove', check=check_)
+                    await self.bot.waiters.wait_for(
+                        'reaction_remove', message, check=check_)
                     await move(page)
 
                 async def add():
-                    await self.bot.wait_for('reaction_add', check=check)
+                    await self.bot.waiters.wait_for(
+                        'reaction_add', message, check=check)
                     await message.remove_reaction(reaction, self.author)
 
                 _, pending = await asyncio.wait(
@@ -107,11 +111,10 @@ class Context(commands.Context):
         page = 0
         while True:
             def check(reaction, user):
-                return (reaction.message.id == message.id and
-                        user == self.author and Emoji(reaction.emoji) in moves)
+                return user == self.author and Emoji(reaction.emoji) in moves
             try:
-                reaction, _ = await self.bot.wait_for(
-                    'reaction_add', timeout=60, check=check)
+                reaction, _ = await self.bot.waiters.wait_for(
+                    'reaction_add', message, timeout=60, check=check)
             except asyncio.TimeoutError:
                 await message.clear_reactions()
                 break
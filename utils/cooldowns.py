@@ -0,0 +1,125 @@
+import asyncio
+import collections
+import time
+
+import discord
+
+from .emoji import Emoji
+
+
+class _Countdown:
+
+    def __init__(self, ctx, retry_after):
+        self.ctx = ctx
+        self.retry_after = retry_after
+        self.end_time = time.monotonic() + retry_after
+        self.clock = None
+        self.updated_at = 0
+        self.busy = True
+
+
+class CooldownDisplay:
+
+    # Reaction routes allow a handful of calls per few seconds per channel,
+    # so past the budget only the first and last frames are shown
+    def __init__(self, *, loop, interval=1, budget=10, per=5):
+        self.loop = loop
+        self.interval = interval
+        self.budget = budget
+        self.per = per
+        self.countdowns = {}
+        self._calls = collections.defaultdict(collections.deque)
+        self._task = None
+
+    def __contains__(self, command):
+        return any(countdown.ctx.command == command
+                   for countdown in self.countdowns.values())
+
+    async def start(self, ctx, retry_after):
+        countdown = _Countdown(ctx, retry_after)
+        self.countdowns[ctx.message.id] = countdown
+        try:
+            await self._call(ctx.channel,
+                             ctx.message.add_reaction(str(Emoji.no_entry)))
+            await self._update(countdown)
+        finally:
+            countdown.busy = False
+
+        if self._task is None or self._task.done():
+            self._task = self.loop.create_task(self._run())
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def _get_clock(self, countdown):
+        remaining = countdown.end_time - time.monotonic()
+        interval = countdown.retry_after / 12
+        # Start at 12 instead of 1
+        number = 12 - int(remaining / interval) or 12
+        return Emoji['clock' + str(number)]
+
+    def _is_limited(self, channel):
+        now = time.monotonic()
+        calls = self._calls.get(channel.id)
+        if calls is None:
+            return False
+        while calls and now - calls[0] >= self.per:
+            calls.popleft()
+        if not calls:
+            del self._calls[channel.id]
+        return len(calls) >= self.budget
+
+    async def _call(self, channel, coro):
+        self._calls[channel.id].append(time.monotonic())
+        try:
+            await coro
+        except discord.HTTPException:
+            pass
+
+    async def _update(self, countdown):
+        clock = self._get_clock(countdown)
+        message, me = countdown.ctx.message, countdown.ctx.me
+        if countdown.clock is not None:
+            await self._call(message.channel, message.remove_reaction(
+                str(countdown.clock), me))
+        await self._call(message.channel, message.add_reaction(str(clock)))
+        countdown.clock = clock
+        countdown.updated_at = time.monotonic()
+
+    async def _finish(self, countdown):
+        message, me = countdown.ctx.message, countdown.ctx.me
+        if countdown.clock is not None:
+            await self._call(message.channel, message.remove_reaction(
+                str(countdown.clock), me))
+        await self._call(message.channel,
+                         message.add_reaction(str(Emoji.repeat)))
+        await self._call(message.channel,
+                         message.remove_reaction(str(Emoji.no_entry), me))
+
+    async def _handle(self, coro, countdown):
+        try:
+            await coro
+        finally:
+            countdown.busy = False
+
+    async def _run(self):
+        while self.countdowns:
+            now = time.monotonic()
+            for id, countdown in list(self.countdowns.items()):
+                # Coalesce by never stacking updates for the same message
+                if countdown.busy:
+                    continue
+
+                if countdown.end_time <= now:
+                    del self.countdowns[id]
+                    coro = self._finish(countdown)
+                elif (self._get_clock(countdown) is countdown.clock or
+                      now - countdown.updated_at < 2 or
+                      self._is_limited(countdown.ctx.channel)):
+                    continue
+                else:
+                    coro = self._update(countdown)
+                countdown.busy = True
+                self.loop.create_task(self._handle(coro, countdown))
+            await asyncio.sleep(self.interval)
@@ -6,6 +6,7 @@ import warnings
 
 from discord.ext import commands
 
+from .metrics import registry
 from .utils import _is_method
 
 
@@ -81,10 +82,28 @@ def cache(*, ignore=None, on=None, unbind=True, typed=False, **kwargs):
         wrapper.cache_info = cache.cache_info
         wrapper.cache_clear = cache_clear
         wrapper.invalidate = invalidate
+        _track_cache(func, cache.cache_info)
         return wrapper
     return decorator
 
 
+def _track_cache(func, cache_info):
+    name = f'{func.__module__}.{func.__qualname__}'
+    hits = registry.counter('cache_hits_total', "Cache hits per function",
+                            ['function'])
+    misses = registry.counter('cache_misses_total',
+                              "Cache misses per function", ['function'])
+    size = registry.gauge('cache_size', "Cached entries per function",
+                          ['function'])
+
+    def collect():
+        info = cache_info()
+        hits.set(info.hits, name)
+        misses.set(info.misses, name)
+        size.set(info.currsize, name)
+    registry.add_collector(('cache', name), collect)
+
+
 def acquire(*, command=False, pool=None, **kwargs):
     def decorator(func):
         assert asyncio.iscoroutinefunction(func)
@@ -92,13 +111,11 @@ def acquire(*, command=False, pool=None, **kwargs):
         @functools.wraps(func)
         async def wrapper(*func_args, **func_kwargs):
             nonlocal pool
-            if pool is None:
+            if pool is None or isinstance(pool, str):
                 # Might also be ctx or possibly bot
                 instance = func_args[0]
-                try:
-                    pool = instance.pool
-                except AttributeError:
-                    pool = instance.bot.pool
+                bot = getattr(instance, 'bot', instance)
+                pool = bot.pools[pool or 'interactive']
 
             async with pool.acquire(**kwargs) as connection:
                 if command:
@@ -1,37 +1,62 @@
+import functools
+import re
+
 from .enums import Emoji, Category, Modifier
 
 
+_shortcode = re.compile(':([a-z0-9_+-]+):')
+
+
 def convert(text):
-    import re
-    text = list(text)
+    output = []
+    position = 0
     start = 0
-    pattern = re.compile(':([a-z0-9_+-]+):')
     while True:
-        match = pattern.search(''.join(text), start)
+        match = _shortcode.search(text, start)
         if match is None:
             break
-        start, end = match.span()
         try:
-            text[start:end] = str(Emoji[match.group(1)])
+            emoji = Emoji[match.group(1)]
         except KeyError:
-            pass
-        start += 1
-    return ''.join(text)
+            # The closing colon might still open another shortcode
+            start = match.start() + 1
+            continue
+        output.append(text[position:match.start()])
+        output.append(str(emoji))
+        position = start = match.end()
+    output.append(text[position:])
+    return ''.join(output)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_trie():
+    # Modified emojis aren't members, so modifiers get matched on their own
+    trie = {}
+    for emoji in Emoji:
+        node = trie
+        for char in emoji.value:
+            node = node.setdefault(char, {})
+        node[None] = emoji
+    return trie
 
 
 def parse(text):
-    import operator
-    text = list(text)
-    positions = {}
-    emojis = sorted(Emoji, key=lambda emoji: len(str(emoji)), reverse=True)
-    for emoji in emojis:
-        value = emoji.value
-        while True:
-            position = ''.join(text).find(value)
-            if position != -1:
-                positions[position] = emoji
-                length = len(value)
-                text[position:position + length] = ' ' * length
-            else:
+    trie = _get_trie()
+    emojis = []
+    i = 0
+    while i < len(text):
+        # Take the longest emoji starting here, otherwise move on by one
+        node = trie
+        match = None
+        for j in range(i, len(text)):
+            node = node.get(text[j])
+            if node is None:
                 break
-    return dict(sorted(positions.items(), key=operator.itemgetter(0))).values()
+            if None in node:
+                match = (node[None], j + 1)
+        if match is not None:
+            emojis.append(match[0])
+            i = match[1]
+        else:
+            i += 1
+    return emojis
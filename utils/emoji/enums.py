@@ -72,4 +72,43 @@ def _get_all_emoji_data():
         yield (name, (None, modifier.value, False))
 
 
-Emoji = Emoji('Emoji', _get_all_emoji_data())
+class _LazyEnum:
+
+    # Creating thousands of members is slow, so only do it on first use
+    def __init__(self, create):
+        self._create = create
+        self._enum = None
+
+    def _get_enum(self):
+        if self._enum is None:
+            self._enum = self._create()
+        return self._enum
+
+    def __getattr__(self, name):
+        return getattr(self._get_enum(), name)
+
+    def __getitem__(self, name):
+        return self._get_enum()[name]
+
+    def __call__(self, *args, **kwargs):
+        return self._get_enum()(*args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._get_enum())
+
+    def __len__(self):
+        return len(self._get_enum())
+
+    def __contains__(self, item):
+        return item in self._get_enum()
+
+    def __repr__(self):
+        return repr(self._get_enum())
+
+
+# The base is bound now, as the name gets taken over by the proxy
+def _create_emoji(base=Emoji):
+    return base('Emoji', _get_all_emoji_data())
+
+
+Emoji = _LazyEnum(_create_emoji)
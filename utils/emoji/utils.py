@@ -1,17 +1,50 @@
-import os
+import hashlib
 import json
+import os
+import pickle
+import sys
 
 
 here = os.path.dirname(os.path.abspath(__file__))
-with open(os.path.join(here, 'emoji_data.json'), encoding='utf-8') as file:
-    _emoji_data = json.load(file)
+_data_path = os.path.join(here, 'emoji_data.json')
+# Per interpreter and checkout, as pickles aren't readable by older Pythons
+_cache_path = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+    'emoji_data', 'emoji_data-{}-py{}{}.pickle'.format(
+        hashlib.md5(_data_path.encode()).hexdigest()[:8],
+        *sys.version_info[:2]))
 
 
-def _get_emoji_data():
-    for category_name, category in _emoji_data.items():
+def _parse_emoji_data():
+    with open(_data_path, encoding='utf-8') as file:
+        emoji_data = json.load(file)
+    for category_name, category in emoji_data.items():
         for emoji in category:
             for name in emoji['names']:
                 yield (name, (
                     category_name, emoji['surrogates'],
                     emoji.get('hasDiversity', False)
                 ))
+
+
+def _get_emoji_data():
+    # Parsing the JSON is slow, so the result is cached until it changes
+    try:
+        if os.path.getmtime(_cache_path) >= os.path.getmtime(_data_path):
+            with open(_cache_path, 'rb') as file:
+                return pickle.load(file)
+    except (OSError, EOFError, ValueError, AttributeError, ImportError,
+            pickle.UnpicklingError):
+        pass  # Rebuilt below
+
+    emoji_data = list(_parse_emoji_data())
+    temporary_path = f'{_cache_path}.{os.getpid()}'
+    try:
+        os.makedirs(os.path.dirname(_cache_path), exist_ok=True)
+        with open(temporary_path, 'wb') as file:
+            # The highest protocol Python 3.6 can read
+            pickle.dump(emoji_data, file, 4)
+        os.replace(temporary_path, _cache_path)
+    except OSError:
+        pass
+    return emoji_data
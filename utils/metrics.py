@@ -0,0 +1,146 @@
+import bisect
+import math
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    labels = ','.join('{}="{}"'.format(
+        name, str(value).replace('\\', r'\\').replace('"', r'\"'))
+        for name, value in pairs)
+    return '{' + labels + '}'
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+# Only ever updated from the loop thread, so plain dicts need no locking
+class _Metric:
+
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def clear(self):
+        self.values.clear()
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} {self.type}'
+        for labels, value in self.values.items():
+            yield (f'{self.name}{_format_labels(self.labels, labels)} '
+                   f'{_format_value(value)}')
+
+
+class Counter(_Metric):
+
+    type = 'counter'
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    # For totals already counted elsewhere, like cache statistics
+    def set(self, value, *labels):
+        self.values[labels] = value
+
+
+class Gauge(_Metric):
+
+    type = 'gauge'
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        self.values[labels] = value
+
+
+class Histogram(_Metric):
+
+    type = 'histogram'
+    buckets = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+    def __init__(self, name, documentation, labels=(), *, buckets=None):
+        super().__init__(name, documentation, labels)
+        if buckets is not None:
+            self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        try:
+            counts, total = self.values[labels]
+        except KeyError:
+            counts, total = [0] * (len(self.buckets) + 1), 0
+        # Buckets are cumulated when rendering rather than on every observe
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.values[labels] = (counts, total + value)
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} {self.type}'
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                bucket = _format_labels(self.labels, labels,
+                                        [('le', _format_value(bound))])
+                yield f'{self.name}_bucket{bucket} {cumulative}'
+            formatted = _format_labels(self.labels, labels)
+            yield f'{self.name}_sum{formatted} {_format_value(total)}'
+            yield f'{self.name}_count{formatted} {cumulative}'
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = {}
+
+    def _get(self, cls, name, *args, **kwargs):
+        # Reloaded extensions get back the metrics they registered before
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = cls(name, *args, **kwargs)
+        elif type(metric) is not cls:
+            raise ValueError(f"{name} is already a {metric.type}")
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._get(Counter, name, documentation, labels)
+
+    def gauge(self, name, documentation, labels=()):
+        return self._get(Gauge, name, documentation, labels)
+
+    def histogram(self, name, documentation, labels=(), *, buckets=None):
+        return self._get(Histogram, name, documentation, labels,
+                         buckets=buckets)
+
+    # Collectors fill in metrics that are cheaper to read at scrape time,
+    # keyed so that reloading replaces instead of adding another one
+    def add_collector(self, key, collector):
+        self.collectors[key] = collector
+
+    def remove_collector(self, key):
+        self.collectors.pop(key, None)
+
+    def render(self):
+        for collector in list(self.collectors.values()):
+            collector()
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        lines.append('')
+        return '\n'.join(lines)
+
+
+registry = Registry()
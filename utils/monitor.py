@@ -0,0 +1,75 @@
+import asyncio
+import collections
+import logging
+import sys
+import threading
+import time
+import traceback
+
+log = logging.getLogger(__name__)
+
+
+class LoopMonitor:
+
+    # Lag is measured on the loop, but the stack of whatever is blocking it
+    # can only be taken from another thread while it's still blocking
+    def __init__(self, *, loop, interval=0.1, threshold=0.5, maxlen=10000):
+        self.loop = loop
+        self.interval = interval
+        self.threshold = threshold
+        self.lags = collections.deque(maxlen=maxlen)
+        self._beat = None
+        self._thread_id = None
+        self._task = None
+        self._stopped = threading.Event()
+        self._watchdog = threading.Thread(target=self._watch, daemon=True,
+                                          name='loop-watchdog')
+
+    def start(self):
+        self._task = self.loop.create_task(self._measure())
+        self._watchdog.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    def collect(self):
+        lags = sorted(self.lags)
+        self.lags.clear()
+        if not lags:
+            return None
+
+        def percentile(fraction):
+            return lags[int(fraction * (len(lags) - 1))]
+        return {'p50': percentile(0.5), 'p90': percentile(0.9),
+                'p99': percentile(0.99), 'max': lags[-1],
+                'samples': len(lags),
+                'stalls': sum(lag >= self.threshold for lag in lags)}
+
+    async def _measure(self):
+        self._thread_id = threading.get_ident()
+        while True:
+            self._beat = time.monotonic()
+            expected = self.loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(self.loop.time() - expected, 0))
+
+    def _watch(self):
+        reported = None
+        while not self._stopped.wait(self.threshold / 2):
+            beat = self._beat
+            if beat is None or beat == reported:
+                continue
+            blocked = time.monotonic() - beat - self.interval
+            if blocked < self.threshold:
+                continue
+
+            # Only report each stall once, however long it lasts
+            reported = beat
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            stack = ''.join(traceback.format_stack(frame))
+            log.warning("Event loop blocked for over %.2fs at:\n%s",
+                        blocked, stack)
@@ -0,0 +1,130 @@
+import logging
+import time
+
+import asyncpg
+
+from . import metrics
+
+log = logging.getLogger(__name__)
+
+query_duration = metrics.registry.histogram(
+    'query_duration_seconds', "Time taken by registered queries", ['query'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1))
+
+
+def _describe(arg):
+    # Only the shape of parameters is logged, never the values
+    if isinstance(arg, (str, bytes, list, tuple, set, dict)):
+        return f'{type(arg).__name__}[{len(arg)}]'
+    return type(arg).__name__
+
+
+class Query:
+
+    def __init__(self, queries, name, sql):
+        self.queries = queries
+        self.name = name
+        self.sql = sql
+
+    async def fetch(self, connection, *args, timeout=None):
+        return await self._run('fetch', connection, args, timeout)
+
+    async def fetchrow(self, connection, *args, timeout=None):
+        return await self._run('fetchrow', connection, args, timeout)
+
+    async def fetchval(self, connection, *args, timeout=None):
+        return await self._run('fetchval', connection, args, timeout)
+
+    async def execute(self, connection, *args, timeout=None):
+        return await self._run('execute', connection, args, timeout)
+
+    async def executemany(self, connection, args, *, timeout=None):
+        return await self._run('executemany', connection, (args,), timeout)
+
+    async def _run(self, method, connection, args, timeout):
+        # Pools are accepted anywhere a connection is, as with asyncpg
+        if isinstance(connection, asyncpg.pool.Pool):
+            async with connection.acquire() as connection:
+                return await self._run(method, connection, args, timeout)
+
+        start_time = time.perf_counter()
+        try:
+            statement = await self.queries.get_statement(connection, self)
+            try:
+                return await self._call(connection, statement, method, args,
+                                        timeout)
+            except (asyncpg.InvalidCachedStatementError,
+                    asyncpg.OutdatedSchemaCacheError):
+                # The schema changed since it was prepared
+                statement = await self.queries.get_statement(
+                    connection, self, refresh=True)
+                return await self._call(connection, statement, method, args,
+                                        timeout)
+        finally:
+            duration = time.perf_counter() - start_time
+            query_duration.observe(duration, self.name)
+            if duration >= self.queries.slow_threshold:
+                shapes = ', '.join(map(_describe, args))
+                log.warning("Slow query %s took %.3fs with (%s)", self.name,
+                            duration, shapes)
+
+    async def _call(self, connection, statement, method, args, timeout):
+        if method == 'executemany':
+            # Also not on prepared statements, but asyncpg reuses the plan
+            return await connection.executemany(self.sql, *args,
+                                                timeout=timeout)
+        elif method == 'execute':
+            # Prepared statements have no execute, so get the status after
+            await statement.fetch(*args, timeout=timeout)
+            return statement.get_statusmsg()
+        return await getattr(statement, method)(*args, timeout=timeout)
+
+
+class QueryRegistry:
+
+    def __init__(self, *, slow_threshold=0.1):
+        self.slow_threshold = slow_threshold
+        self.queries = {}
+        self._statements = {}
+
+    def add(self, name, sql):
+        # Replaced on reload so the new SQL gets prepared
+        query = Query(self, name, sql)
+        self.queries[name] = query
+        for statements in self._statements.values():
+            statements.pop(name, None)
+        return query
+
+    # Run once for each new connection, anything added later gets prepared
+    # the first time it's used
+    async def prepare(self, connection):
+        # Statements refer back to their connection, so they can't be weakly
+        # keyed and are dropped once their connection is closed instead
+        for raw_connection in list(self._statements):
+            if raw_connection.is_closed():
+                del self._statements[raw_connection]
+        for query in list(self.queries.values()):
+            # One query that can't be prepared, say before its migration,
+            # mustn't stop the connection from being used for the rest
+            try:
+                await self.get_statement(connection, query)
+            except asyncpg.PostgresError as e:
+                log.warning("Could not prepare query %s: %s", query.name, e)
+
+    async def get_statement(self, connection, query, *, refresh=False):
+        # Pooled connections are proxies that don't outlive an acquire
+        raw_connection = getattr(connection, '_con', connection)
+        statements = self._statements.setdefault(raw_connection, {})
+        statement = statements.get(query.name)
+        if statement is None or refresh:
+            statement = await connection.prepare(query.sql)
+            statements[query.name] = statement
+        return statement
+
+
+queries = QueryRegistry()
+
+# Shared by the prefix lookup of the bot and the meta extension
+get_prefix = queries.add('get_prefix', """
+    SELECT prefix FROM meta.guilds WHERE id = $1;
+""")
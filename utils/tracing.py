@@ -0,0 +1,80 @@
+import heapq
+import itertools
+import time
+
+
+class Span:
+
+    def __init__(self, trace, name, tags):
+        self.trace = trace
+        self.name = name
+        self.tags = tags
+        self.start = None
+        self.end = None
+
+    def __enter__(self):
+        self.start = time.perf_counter() - self.trace.started_at
+        return self
+
+    def __exit__(self, *exc_info):
+        self.end = time.perf_counter() - self.trace.started_at
+        # Spans are only kept once done, and list.append is thread-safe, so
+        # spans can also be recorded from executor threads
+        self.trace.spans.append(self)
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+
+class Trace:
+
+    def __init__(self):
+        self.name = None
+        self.started_at = time.perf_counter()
+        self.created_at = time.time()
+        self.duration = None
+        self.spans = []
+
+    def span(self, name, **tags):
+        return Span(self, name, tags)
+
+    def finish(self, name):
+        if self.duration is None:
+            self.name = name
+            self.duration = time.perf_counter() - self.started_at
+        return self
+
+    def summary(self):
+        stages = {}
+        for span in self.spans:
+            stages[span.name] = stages.get(span.name, 0) + span.duration
+        return {'total': round(self.duration, 6),
+                'stages': {name: round(duration, 6)
+                           for name, duration in stages.items()}}
+
+
+class TraceBuffer:
+
+    # A min-heap on duration, so the fastest of the kept traces is dropped
+    def __init__(self, maxsize=50):
+        self.maxsize = maxsize
+        self._traces = []
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._traces)
+
+    def add(self, trace):
+        item = (trace.duration, next(self._counter), trace)
+        if len(self._traces) < self.maxsize:
+            heapq.heappush(self._traces, item)
+        elif item[0] > self._traces[0][0]:
+            heapq.heapreplace(self._traces, item)
+
+    def slowest(self, count=None):
+        items = heapq.nlargest(count or len(self._traces), self._traces)
+        return [trace for _, _, trace in items]
+
+    def clear(self):
+        self._traces.clear()
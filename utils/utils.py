@@ -19,7 +19,12 @@ def _is_method(func, args, *, command=False):
         return isinstance(method, types.MethodType)
 
 
-async def invoke(command, ctx, *, content=None, **kwargs):
+async def invoke(command, ctx, *, content=None, direct=True, **kwargs):
+    # Changing where or who the message is from needs a fresh context
+    if direct and not kwargs.keys() & {'author', 'channel', 'guild'}:
+        await _invoke_direct(command, ctx, content=content, **kwargs)
+        return
+
     if isinstance(command, commands.Command):
         command = command.qualified_name
 
@@ -41,6 +46,36 @@ async def invoke(command, ctx, *, content=None, **kwargs):
         await ctx.command.invoke(ctx)
 
 
+async def _invoke_direct(command, ctx, *, content=None, **kwargs):
+    if not isinstance(command, commands.Command):
+        command = ctx.bot.get_command(command)
+
+    if content is not None:
+        view = commands.view.StringView(content)
+    else:
+        view = commands.view.StringView(ctx.message.content)
+        assert view.skip_string(ctx.prefix)
+        assert view.skip_string(ctx.command.qualified_name)
+
+    message = ctx.message
+    if kwargs:
+        message = copy.copy(message)
+        for item, value in kwargs.items():
+            setattr(message, item, value)
+
+    # Command.invoke still runs the checks, cooldowns and converters
+    ctx = copy.copy(ctx)
+    ctx.message = message
+    ctx.command = command
+    ctx.view = view
+    ctx.args = []
+    ctx.kwargs = {}
+    ctx.invoked_with = command.name
+    ctx.invoked_subcommand = None
+    ctx.subcommand_passed = None
+    await command.invoke(ctx)
+
+
 def get_color(ctx):
     if ctx.guild is not None and ctx.me.color.value:
         return ctx.me.color
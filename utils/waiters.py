@@ -0,0 +1,71 @@
+import asyncio
+import collections
+import functools
+import heapq
+import itertools
+
+
+class WaiterRegistry:
+
+    def __init__(self, *, loop):
+        self.loop = loop
+        self._waiters = collections.defaultdict(list)
+        self._deadlines = []
+        self._counter = itertools.count()
+        self._handle = None
+
+    def wait_for(self, event, message, *, check=None, timeout=None):
+        future = self.loop.create_future()
+        key = (event, message.id)
+        waiter = (future, check)
+        self._waiters[key].append(waiter)
+        future.add_done_callback(
+            functools.partial(self._remove, key, waiter))
+
+        if timeout is not None:
+            deadline = self.loop.time() + timeout
+            heapq.heappush(self._deadlines,
+                           (deadline, next(self._counter), future))
+            if self._deadlines[0][2] is future:
+                self._schedule()
+        return future
+
+    def dispatch(self, event, message_id, *args):
+        waiters = self._waiters.get((event, message_id))
+        if not waiters:
+            return
+
+        for future, check in list(waiters):
+            if future.done():
+                continue
+            try:
+                result = check is None or check(*args)
+            except Exception as error:
+                future.set_exception(error)
+                continue
+            if result:
+                future.set_result(args[0] if len(args) == 1 else args)
+
+    def _remove(self, key, waiter, future):
+        waiters = self._waiters[key]
+        waiters.remove(waiter)
+        if not waiters:
+            del self._waiters[key]
+
+    def _schedule(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if self._deadlines:
+            deadline = self._deadlines[0][0]
+            self._handle = self.loop.call_at(deadline, self._reap)
+
+    # One timer for every waiter, always set to the earliest deadline
+    def _reap(self):
+        self._handle = None
+        now = self.loop.time()
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, _, future = heapq.heappop(self._deadlines)
+            if not future.done():
+                future.set_exception(asyncio.TimeoutError())
+        self._schedule()